@@ -0,0 +1,119 @@
+import gzip
+import json
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import POSTS_PER_PAGE
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Post.objects.bulk_create([
+            Post(author=cls.author, group=cls.group, text=f'Пост {number}')
+            for number in range(POSTS_PER_PAGE + 3)
+        ])
+        # Одинаковая дата: порядок страниц держится на id
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        cls.post = Post.objects.create(author=cls.reader, text='Свой пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий')
+
+    def setUp(self):
+        self.client = Client()
+
+    def get_json(self, url, data=None, status=HTTPStatus.OK, **extra):
+        response = self.client.get(url, data, **extra)
+        self.assertEqual(response.status_code, status)
+        return json.loads(response.content)
+
+    def walk(self, url, data=None):
+        items = []
+        page = self.get_json(url, data)
+        while True:
+            items.extend(page['results'])
+            if page['next'] is None:
+                return items
+            page = self.get_json(page['next'])
+
+    def test_posts_match_html_order(self):
+        ids = [item['id'] for item in self.walk(reverse('api:post_list'))]
+        self.assertEqual(ids, list(
+            Post.objects.order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True)))
+
+    def test_sparse_fields(self):
+        page = self.get_json(
+            reverse('api:post_list'), {'fields': 'text,author'})
+        self.assertEqual(set(page['results'][0]), {'text', 'author'})
+        self.assertEqual(page['results'][0]['author'], 'reader')
+        self.assertIn('fields=text%2Cauthor', page['next'])
+
+    def test_unknown_field(self):
+        error = self.get_json(reverse('api:post_list'), {'fields': 'secret'},
+                              status=HTTPStatus.BAD_REQUEST)
+        self.assertIn('secret', error['error'])
+
+    def test_scoped_lists(self):
+        cases = {
+            reverse('api:group_posts', args=[self.group.slug]):
+                POSTS_PER_PAGE + 3,
+            reverse('api:author_posts', args=[self.reader.username]): 1,
+            reverse('api:comment_list', args=[self.post.pk]): 1,
+            reverse('api:group_list'): 1,
+        }
+        for url, total in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(len(self.walk(url)), total)
+
+    def test_post_detail(self):
+        item = self.get_json(reverse('api:post_detail', args=[self.post.pk]))
+        self.assertEqual(item['text'], 'Свой пост')
+        self.assertIsNone(item['group'])
+        self.assertIsNone(item['image'])
+        self.assertEqual(item['comment_count'], 1)
+        self.get_json(reverse('api:post_detail', args=[0]),
+                      status=HTTPStatus.NOT_FOUND)
+
+    def test_follow_feed(self):
+        url = reverse('api:follow_feed')
+        self.get_json(url, status=HTTPStatus.UNAUTHORIZED)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        items = self.walk(url, {'fields': 'id,author'})
+        self.assertEqual(len(items), POSTS_PER_PAGE + 3)
+        self.assertEqual({item['author'] for item in items}, {'author'})
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_feed_merges_celebrities(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        items = self.walk(reverse('api:follow_feed'), {'fields': 'text'})
+        self.assertEqual(len(items), POSTS_PER_PAGE + 3)
+        self.assertEqual(set(items[0]), {'text'})
+
+    def test_list_is_single_query(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('api:post_list'))
+
+    def test_gzip(self):
+        response = self.client.get(
+            reverse('api:post_list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        page = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(page['results']), POSTS_PER_PAGE)
+
+    def test_read_only(self):
+        response = self.client.post(reverse('api:post_list'))
+        self.assertEqual(response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
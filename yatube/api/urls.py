@@ -0,0 +1,17 @@
+from django.urls import path
+
+from api.views import (author_posts, comment_list, follow_feed, group_list,
+                       group_posts, post_detail, post_list)
+
+app_name = 'api'
+urlpatterns = [
+    path('v1/posts/', post_list, name='post_list'),
+    path('v1/posts/<int:post_id>/', post_detail, name='post_detail'),
+    path('v1/posts/<int:post_id>/comments/', comment_list,
+         name='comment_list'),
+    path('v1/groups/', group_list, name='group_list'),
+    path('v1/groups/<slug:slug>/posts/', group_posts, name='group_posts'),
+    path('v1/authors/<str:username>/posts/', author_posts,
+         name='author_posts'),
+    path('v1/follow/', follow_feed, name='follow_feed'),
+]
@@ -0,0 +1,184 @@
+from functools import partial, wraps
+
+from django.contrib.auth import get_user_model
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_safe
+
+from posts import timeline
+from posts.models import Group, Post
+from posts.utils import POSTS_PER_PAGE, CursorPaginator
+
+User = get_user_model()
+
+# Поле ответа -> путь для .values()
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comment_count': 'comment_count',
+}
+GROUP_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'slug': 'slug',
+    'description': 'description',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'parent': 'parent_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+# Ключи курсора: всегда читаются, но в ответ попадают только по запросу
+POST_KEYS = ('pk', 'pub_date')
+COMMENT_KEYS = ('pk', 'created')
+COMMENT_ORDERING = ('-created', '-pk')
+GROUP_KEYS = ('pk',)
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def error_response(message, status):
+    return JsonResponse({'error': message}, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def api_view(view):
+    """Только GET/HEAD, gzip по Accept-Encoding и ошибки в виде JSON."""
+    @gzip_page
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except FieldsError as error:
+            return error_response(str(error), 400)
+        except Http404:
+            return error_response('Не найдено', 404)
+    return wrapper
+
+
+def selected(request, fields):
+    """Имена полей из ``?fields=a,b``; без параметра — все поля."""
+    raw = request.GET.get('fields', '')
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    if not names:
+        return list(fields)
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise FieldsError(f'Неизвестные поля: {", ".join(unknown)}')
+    return list(dict.fromkeys(names))
+
+
+def lookups(names, fields, keys=()):
+    return list(dict.fromkeys([*keys, *(fields[name] for name in names)]))
+
+
+def serialize(request, names, fields, row):
+    """Строка ``.values()`` -> объект ответа с запрошенными полями."""
+    item = {name: row[fields[name]] for name in names}
+    if item.get('image'):
+        item['image'] = request.build_absolute_uri(
+            Post._meta.get_field('image').storage.url(item['image']))
+    elif 'image' in item:
+        item['image'] = None
+    return item
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def page_response(request, paginator, convert):
+    page = paginator.get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [convert(row) for row in page],
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def posts_response(request, posts):
+    """Страница постов тех же запросов, что и HTML-списки."""
+    names = selected(request, POST_FIELDS)
+    paginator = CursorPaginator(
+        posts.values(*lookups(names, POST_FIELDS, POST_KEYS)),
+        POSTS_PER_PAGE)
+    return page_response(
+        request, paginator, partial(serialize, request, names, POST_FIELDS))
+
+
+@api_view
+def post_list(request):
+    return posts_response(request, Post.objects.all())
+
+
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return posts_response(request, group.posts)
+
+
+@api_view
+def author_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return posts_response(request, author.posts)
+
+
+@api_view
+def post_detail(request, post_id):
+    names = selected(request, POST_FIELDS)
+    row = Post.objects.filter(pk=post_id).values(
+        *lookups(names, POST_FIELDS)).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(serialize(request, names, POST_FIELDS, row),
+                        json_dumps_params={'ensure_ascii': False})
+
+
+@api_view
+def comment_list(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    names = selected(request, COMMENT_FIELDS)
+    paginator = CursorPaginator(
+        post.comments.filter(active=True).values(
+            *lookups(names, COMMENT_FIELDS, COMMENT_KEYS)),
+        POSTS_PER_PAGE, ordering=COMMENT_ORDERING)
+    return page_response(
+        request, paginator,
+        partial(serialize, request, names, COMMENT_FIELDS))
+
+
+@api_view
+def group_list(request):
+    names = selected(request, GROUP_FIELDS)
+    paginator = CursorPaginator(
+        Group.objects.values(*lookups(names, GROUP_FIELDS, GROUP_KEYS)),
+        POSTS_PER_PAGE, ordering=GROUP_KEYS)
+    return page_response(
+        request, paginator, partial(serialize, request, names, GROUP_FIELDS))
+
+
+@api_view
+def follow_feed(request):
+    if not request.user.is_authenticated:
+        return error_response('Нужна авторизация', 401)
+    names = selected(request, POST_FIELDS)
+    paginator = timeline.feed_paginator(
+        request.user, POSTS_PER_PAGE,
+        values=lookups(names, POST_FIELDS, ('pub_date',)))
+    return page_response(
+        request, paginator, partial(serialize, request, names, POST_FIELDS))
@@ -0,0 +1,8 @@
+"""Замеры времени ответа страниц на синтетических базах разного размера.
+
+Запуск из папки ``yatube``::
+
+    python -m benchmarks run --sizes 100,1000,10000
+    python -m benchmarks compare benchmarks/baselines/main.json \\
+        benchmarks/baselines/current.json --tolerance 0.2
+"""
@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+
+
+def sizes(value):
+    return [int(size) for size in value.split(',')]
+
+
+def parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Замеры времени ответа страниц Yatube')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser(
+        'run', help='Обойти маршруты на базах нескольких размеров')
+    run.add_argument('--sizes', type=sizes, default=[100, 1000, 10000],
+                     help='Число постов в базах, через запятую')
+    run.add_argument('--repeat', type=int, default=30)
+    run.add_argument('--warmup', type=int, default=3)
+    run.add_argument('--cold', action='store_true',
+                     help='Очищать кеш перед каждым замеренным запросом')
+    run.add_argument('--route', action='append', dest='routes',
+                     help='Замерить только этот маршрут, например '
+                          'posts:index; можно повторять')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--output',
+                     help='Куда сохранить результаты, по умолчанию '
+                          'benchmarks/baselines/current.json')
+    run.add_argument('--baseline',
+                     help='Сравнить результаты с этим файлом')
+    run.add_argument('--tolerance', type=float, default=0.2)
+
+    concurrency = commands.add_parser(
+        'concurrency',
+        help='Сравнить движки БД под чтением и записью из нескольких потоков')
+    concurrency.add_argument('--size', type=int, default=1000,
+                             help='Число постов в базе')
+    concurrency.add_argument('--readers', type=int, default=8)
+    concurrency.add_argument('--writers', type=int, default=4)
+    concurrency.add_argument('--duration', type=float, default=10,
+                             help='Длительность прогона профиля, секунды')
+    concurrency.add_argument('--seed', type=int, default=0)
+
+    compare = commands.add_parser(
+        'compare', help='Сравнить два сохранённых замера')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--tolerance', type=float, default=0.2,
+                         help='Допустимый относительный рост, 0.2 — 20%%')
+    return parser
+
+
+def report(baseline, current, tolerance):
+    from benchmarks.baseline import compare
+
+    regressions = compare(baseline, current, tolerance)
+    for line in regressions:
+        print(line)
+    if regressions:
+        print(f'Регрессий: {len(regressions)}')
+        return 1
+    print('Регрессий нет')
+    return 0
+
+
+def main(argv=None):
+    options = parser().parse_args(argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+    from django.test.utils import setup_test_environment
+
+    from benchmarks import baseline, runner
+
+    if options.command == 'compare':
+        return report(baseline.load(options.baseline),
+                      baseline.load(options.current), options.tolerance)
+    # DEBUG выключен: иначе в ответы встраивается debug toolbar
+    setup_test_environment(debug=False)
+    if options.command == 'concurrency':
+        from benchmarks import concurrency
+
+        print(concurrency.table(concurrency.run(
+            options.size, options.readers, options.writers,
+            options.duration, options.seed)))
+        return 0
+    results = runner.run(options.sizes, options.repeat, options.warmup,
+                         options.cold, options.routes, options.seed)
+    print(baseline.table(results))
+    output = options.output or os.path.join(
+        baseline.BASELINES_DIR, 'current.json')
+    baseline.save(output, results, repeat=options.repeat,
+                  warmup=options.warmup, cold=options.cold,
+                  seed=options.seed)
+    print(f'Результаты сохранены в {output}')
+    if options.baseline:
+        return report(baseline.load(options.baseline), results,
+                      options.tolerance)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import json
+import os
+import platform
+from datetime import datetime, timezone
+
+import django
+
+BASELINES_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+LATENCIES = ('p50', 'p95', 'p99')
+# Меньшие сдвиги времени считаются шумом при любом допуске, мс
+MIN_DELTA = 1.0
+
+
+def save(path, results, **options):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    document = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            **options,
+        },
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(document, file, ensure_ascii=False, indent=2)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)['results']
+
+
+def compare_route(old, new, tolerance, min_delta=MIN_DELTA):
+    """Регрессии одного маршрута: список строк ``метрика: было -> стало``."""
+    if 'error' in new and 'error' not in old:
+        return [f'ошибка: {new["error"]}']
+    if 'error' in new or 'error' in old:
+        return []
+    problems = []
+    if new['status'] != old['status']:
+        problems.append(f'status: {old["status"]} -> {new["status"]}')
+    for metric in LATENCIES:
+        if (new[metric] > old[metric] * (1 + tolerance)
+                and new[metric] - old[metric] > min_delta):
+            problems.append(
+                f'{metric}: {old[metric]:.1f} -> {new[metric]:.1f} мс')
+    # Число запросов детерминировано, поэтому допуск к нему не применяется
+    if new['queries'] > old['queries']:
+        problems.append(f'queries: {old["queries"]} -> {new["queries"]}')
+    if new['bytes'] > old['bytes'] * (1 + tolerance):
+        problems.append(f'bytes: {old["bytes"]} -> {new["bytes"]}')
+    return problems
+
+
+def compare(baseline, current, tolerance, min_delta=MIN_DELTA):
+    """Регрессии ``current`` относительно ``baseline`` по размерам базы.
+
+    Маршруты и размеры, которых нет в одном из замеров, пропускаются.
+    """
+    regressions = []
+    for size, routes in current.items():
+        for name, new in routes.items():
+            old = baseline.get(size, {}).get(name)
+            if old is None:
+                continue
+            for problem in compare_route(old, new, tolerance, min_delta):
+                regressions.append(f'[{size}] {name}: {problem}')
+    return regressions
+
+
+def table(results):
+    lines = [f'{"size":>7} {"route":<32} {"status":>6} {"p50":>8} '
+             f'{"p95":>8} {"p99":>8} {"queries":>7} {"bytes":>8}']
+    for size, routes in results.items():
+        for name, result in routes.items():
+            if 'error' in result:
+                lines.append(f'{size:>7} {name:<32} {result["error"]}')
+                continue
+            lines.append(
+                f'{size:>7} {name:<32} {result["status"]:>6} '
+                f'{result["p50"]:>8.2f} {result["p95"]:>8.2f} '
+                f'{result["p99"]:>8.2f} {result["queries"]:>7} '
+                f'{result["bytes"]:>8}'
+            )
+    return '\n'.join(lines)
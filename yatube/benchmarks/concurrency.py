@@ -0,0 +1,162 @@
+"""Чтения и записи из нескольких потоков на одной файловой базе SQLite.
+
+Один и тот же засеянный файл копируется для каждого профиля движка.
+Читатели открывают страницу поста, писатели комментируют его же. Запросы
+идут через ``WSGIHandler``, а не тестовый клиент, чтобы сигналы начала
+и конца запроса закрывали или сохраняли соединения, как на сервере.
+"""
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, connections
+from django.test import Client, RequestFactory
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from core.routes import heaviest
+
+from .runner import percentile, seed
+
+# Профиль «stock» — то, что было до core.db: журнал отката и новое
+# соединение на каждый запрос
+PROFILES = {
+    'stock': {'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': 0},
+    'tuned': {'ENGINE': 'core.db', 'CONN_MAX_AGE': 60},
+}
+KINDS = ('read', 'write')
+
+
+class Load:
+    """Запросы одного прогона: окружения WSGI для чтения и записи."""
+
+    def __init__(self, viewer, post_id):
+        client = Client()
+        client.force_login(viewer)
+        self.token = get_random_string(32)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.cookie = (f'{settings.SESSION_COOKIE_NAME}={session}; '
+                       f'{settings.CSRF_COOKIE_NAME}={self.token}')
+        self.detail = reverse('posts:post_detail', args=[post_id])
+        self.comment = reverse('posts:add_comment', args=[post_id])
+        self.factory = RequestFactory()
+
+    def environ(self, kind, number):
+        if kind == 'read':
+            request = self.factory.get(self.detail, HTTP_COOKIE=self.cookie)
+        else:
+            request = self.factory.post(
+                self.comment, {'text': f'Комментарий {number}'},
+                HTTP_COOKIE=self.cookie, HTTP_X_CSRFTOKEN=self.token)
+        return request.environ
+
+
+def worker(handler, load, kind, deadline, samples, errors):
+    """Шлёт запросы одного вида, пока не истечёт время."""
+    number = 0
+    try:
+        while perf_counter() < deadline:
+            statuses = []
+            start = perf_counter()
+            response = handler(
+                load.environ(kind, number),
+                lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()
+            samples.append((perf_counter() - start) * 1000)
+            if int(statuses[0].split()[0]) >= 400:
+                errors.append(statuses[0])
+            number += 1
+    finally:
+        connections.close_all()
+
+
+def run_profile(path, profile, load, readers, writers, duration):
+    """Нагружает базу ``path`` движком ``profile``, возвращает сводку."""
+    settings_dict = connections.databases['default']
+    saved = {key: settings_dict.get(key) for key in ('NAME', *profile)}
+    settings_dict.update(profile, NAME=path)
+    cache.clear()
+    handler = WSGIHandler()
+    results = {kind: ([], []) for kind in KINDS}
+    deadline = perf_counter() + duration
+    threads = [
+        threading.Thread(target=worker, args=(
+            handler, load, kind, deadline, *results[kind]))
+        for kind, count in (('read', readers), ('write', writers))
+        for _ in range(count)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        settings_dict.update(saved)
+    summary = {}
+    for kind, (samples, errors) in results.items():
+        summary[kind] = {
+            'requests': len(samples),
+            'per_second': round(len(samples) / duration, 1),
+            'p50': round(percentile(samples, 50), 3) if samples else None,
+            'p95': round(percentile(samples, 95), 3) if samples else None,
+            'errors': len(errors),
+        }
+    return summary
+
+
+def run(size, readers, writers, duration, seed_value=0):
+    """Один засеянный файл, по копии на каждый профиль из ``PROFILES``."""
+    # Ошибки «database is locked» считаются, а не печатаются трассировкой
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    logging.getLogger('core.middleware').setLevel(logging.ERROR)
+    directory = tempfile.mkdtemp(prefix='yatube-concurrency-')
+    template = os.path.join(directory, 'seed.sqlite3')
+    connection.settings_dict['TEST']['NAME'] = template
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False)
+    try:
+        seed(size, seed_value)
+        viewer, values = heaviest()
+        load = Load(viewer, values['post_id'])
+        connection.close()
+        # Копии начинают с журнала отката: WAL включает только core.db
+        with sqlite3.connect(template) as database:
+            database.execute('PRAGMA journal_mode = DELETE')
+        results = {}
+        for name, profile in PROFILES.items():
+            path = os.path.join(directory, f'{name}.sqlite3')
+            shutil.copyfile(template, path)
+            results[name] = run_profile(
+                path, profile, load, readers, writers, duration)
+        return results
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def table(results):
+    header = (f'{"профиль":<8} {"вид":<6} {"запросов/с":>11} '
+              f'{"p50, мс":>9} {"p95, мс":>9} {"ошибок":>7}')
+    lines = [header, '-' * len(header)]
+    for name, summary in results.items():
+        for kind in KINDS:
+            row = summary[kind]
+            lines.append(
+                f'{name:<8} {kind:<6} {row["per_second"]:>11} '
+                f'{row["p50"] or "-":>9} {row["p95"] or "-":>9} '
+                f'{row["errors"]:>7}')
+    if {'stock', 'tuned'} <= results.keys():
+        for kind in KINDS:
+            before = results['stock'][kind]['per_second']
+            after = results['tuned'][kind]['per_second']
+            if before:
+                lines.append(f'{kind}: tuned/stock = {after / before:.2f}×')
+    return '\n'.join(lines)
@@ -0,0 +1,111 @@
+import logging
+import os
+import shutil
+import tempfile
+from functools import partial
+from io import StringIO
+from math import ceil
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+
+from core.query_budget import QueryRecorder
+from core.routes import collect, heaviest, read
+
+# Перелогиниваться перед каждым запросом: view разлогинивает клиента
+RELOGIN = {'users:logout'}
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples, percent):
+    """Процентиль методом ближайшего ранга."""
+    ordered = sorted(samples)
+    return ordered[max(ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def measure(client, url, repeat, warmup, cold=False, before=None):
+    """Замеряет ``repeat`` GET-запросов после ``warmup`` прогревочных.
+
+    Время — в миллисекундах, запросы к БД — максимум по замерам.
+    """
+    for _ in range(warmup):
+        if before:
+            before()
+        read(client.get(url))
+    timings, queries = [], []
+    for _ in range(repeat):
+        if before:
+            before()
+        if cold:
+            cache.clear()
+        recorder = QueryRecorder()
+        with recorder.record():
+            start = perf_counter()
+            response = client.get(url)
+            # Потоковый ответ строится при чтении: замер включает его
+            body = read(response)
+            timings.append((perf_counter() - start) * 1000)
+        queries.append(recorder.count)
+    result = {'url': url, 'status': response.status_code}
+    for percent in PERCENTILES:
+        result[f'p{percent}'] = round(percentile(timings, percent), 3)
+    result['queries'] = max(queries)
+    result['bytes'] = len(body)
+    return result
+
+
+def seed(size, seed_value):
+    """Заполняет базу: ``size`` постов, пользователей — в десять раз меньше."""
+    call_command(
+        'seed_yatube', posts=size, users=max(size // 10, 10),
+        seed=seed_value, stdout=StringIO())
+
+
+def run_size(size, repeat, warmup, cold=False, names=None, seed_value=0):
+    """Создаёт отдельную тестовую базу на ``size`` постов и обходит маршруты.
+
+    База — временный файл, а не память: так замер ближе к боевому
+    SQLite, и каждый размер начинается с пустой базы.
+    """
+    directory = tempfile.mkdtemp(prefix='yatube-bench-')
+    connection.settings_dict['TEST']['NAME'] = os.path.join(
+        directory, f'{size}.sqlite3')
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False)
+    try:
+        seed(size, seed_value)
+        cache.clear()
+        viewer, values = heaviest()
+        client = Client()
+        client.force_login(viewer)
+        results = {}
+        for route in collect(values):
+            if names and route.name not in names:
+                continue
+            before = None
+            if route.name in RELOGIN:
+                before = partial(client.force_login, viewer)
+            try:
+                results[route.name] = measure(
+                    client, route.url, repeat, warmup, cold, before)
+            except Exception as error:
+                # Упавший view не должен обрывать замер остальных
+                results[route.name] = {'url': route.url, 'error': repr(error)}
+            if before:
+                before()
+        return results
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(sizes, repeat, warmup, cold=False, names=None, seed_value=0):
+    # Превышения бюджетов и так видны в колонке queries
+    logging.getLogger('core.middleware').setLevel(logging.ERROR)
+    return {
+        str(size): run_size(size, repeat, warmup, cold, names, seed_value)
+        for size in sizes
+    }
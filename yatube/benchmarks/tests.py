@@ -0,0 +1,105 @@
+from django.test import SimpleTestCase
+
+from benchmarks import baseline
+from benchmarks.runner import percentile
+from core.routes import collect
+
+RESULT = {'url': '/', 'status': 200, 'p50': 10.0, 'p95': 20.0,
+          'p99': 30.0, 'queries': 5, 'bytes': 1000}
+
+
+def result(**changes):
+    return {**RESULT, **changes}
+
+
+class CompareRouteTest(SimpleTestCase):
+    def test_same_result(self):
+        self.assertEqual(baseline.compare_route(RESULT, result(), 0.1), [])
+
+    def test_latency_within_tolerance(self):
+        self.assertEqual(
+            baseline.compare_route(RESULT, result(p95=21.9), 0.1), [])
+
+    def test_latency_over_tolerance(self):
+        problems = baseline.compare_route(RESULT, result(p95=22.5), 0.1)
+        self.assertEqual(problems, ['p95: 20.0 -> 22.5 мс'])
+
+    def test_small_delta_is_noise(self):
+        """Быстрый маршрут: вдвое дольше, но меньше чем на MIN_DELTA."""
+        old = result(p50=0.2)
+        new = result(p50=0.2 + baseline.MIN_DELTA * 0.9)
+        self.assertEqual(baseline.compare_route(old, new, 0.1), [])
+        self.assertEqual(
+            baseline.compare_route(old, new, 0.1, min_delta=0),
+            [f'p50: 0.2 -> {new["p50"]:.1f} мс'])
+
+    def test_any_query_increase(self):
+        problems = baseline.compare_route(RESULT, result(queries=6), 10)
+        self.assertEqual(problems, ['queries: 5 -> 6'])
+
+    def test_fewer_queries_and_faster(self):
+        new = result(queries=3, p50=1.0, p95=2.0, p99=3.0, bytes=10)
+        self.assertEqual(baseline.compare_route(RESULT, new, 0.1), [])
+
+    def test_status_change(self):
+        problems = baseline.compare_route(RESULT, result(status=500), 0.1)
+        self.assertEqual(problems, ['status: 200 -> 500'])
+
+    def test_bytes_over_tolerance(self):
+        problems = baseline.compare_route(RESULT, result(bytes=1200), 0.1)
+        self.assertEqual(problems, ['bytes: 1000 -> 1200'])
+
+    def test_new_error(self):
+        problems = baseline.compare_route(
+            RESULT, {'url': '/', 'error': 'TypeError()'}, 0.1)
+        self.assertEqual(problems, ['ошибка: TypeError()'])
+
+    def test_old_error(self):
+        """Починенный или всё ещё падающий маршрут — не регрессия."""
+        error = {'url': '/', 'error': 'TypeError()'}
+        self.assertEqual(baseline.compare_route(error, RESULT, 0.1), [])
+        self.assertEqual(baseline.compare_route(error, error, 0.1), [])
+
+
+class CompareTest(SimpleTestCase):
+    def test_regressions_are_labelled(self):
+        old = {'100': {'posts:index': RESULT}}
+        new = {'100': {'posts:index': result(queries=7)}}
+        self.assertEqual(baseline.compare(old, new, 0.1),
+                         ['[100] posts:index: queries: 5 -> 7'])
+
+    def test_missing_routes_and_sizes_are_skipped(self):
+        old = {'100': {'posts:index': RESULT}}
+        new = {
+            '100': {'posts:search': result(queries=50)},
+            '1000': {'posts:index': result(queries=50)},
+        }
+        self.assertEqual(baseline.compare(old, new, 0.1), [])
+
+
+class PercentileTest(SimpleTestCase):
+    def test_nearest_rank(self):
+        samples = [5, 1, 4, 2, 3]
+        self.assertEqual(percentile(samples, 50), 3)
+        self.assertEqual(percentile(samples, 95), 5)
+        self.assertEqual(percentile(samples, 20), 1)
+        self.assertEqual(percentile(samples, 21), 2)
+
+    def test_single_sample(self):
+        self.assertEqual(percentile([7], 0), 7)
+        self.assertEqual(percentile([7], 99), 7)
+
+
+class CollectTest(SimpleTestCase):
+    VALUES = {
+        'slug': 'group', 'username': 'author', 'post_id': 1,
+        'own_post_id': 2, 'comment_id': 3, 'feed_format': 'atom',
+        'name': 'posts', 'uidb64': 'MQ', 'token': 'token', 'query': 'слово',
+    }
+
+    def test_routes(self):
+        routes = {route.name: route.url for route in collect(self.VALUES)}
+        self.assertNotIn('posts:404', routes)
+        self.assertEqual(routes['posts:search'],
+                         '/search/?q=%D1%81%D0%BB%D0%BE%D0%B2%D0%BE')
+        self.assertEqual(routes['posts:post_edit'], '/posts/2/edit/')
@@ -0,0 +1,44 @@
+"""SQLite для нескольких воркеров и потоков.
+
+Каждое соединение включает WAL: читатели не ждут писателя, писатель —
+читателей. ``synchronous=NORMAL`` в WAL теряет при сбое питания только
+последние транзакции, но не портит базу. Транзакции начинаются с
+``BEGIN IMMEDIATE``: писатель берёт блокировку сразу и ждёт её по
+``busy_timeout``, а не падает с «database is locked», когда чтение внутри
+транзакции пытается перейти в запись.
+
+Прагмы и режим транзакций переопределяются ключами ``PRAGMAS`` и
+``TRANSACTION_MODE`` в ``DATABASES``.
+"""
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Чтение страниц базы через отображение в память, до 256 МиБ
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — в КиБ: 64 МиБ кеша страниц на соединение
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+TRANSACTION_MODE = 'IMMEDIATE'
+TRANSACTION_MODES = {'DEFERRED', 'IMMEDIATE', 'EXCLUSIVE'}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = {**PRAGMAS, **self.settings_dict.get('PRAGMAS', {})}
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE', TRANSACTION_MODE)
+        if mode.upper() not in TRANSACTION_MODES:
+            raise ValueError(f'Неизвестный режим транзакций: {mode}')
+        return mode.upper()
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
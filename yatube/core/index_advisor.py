@@ -0,0 +1,311 @@
+"""Поиск запросов страниц, которым не хватает индекса.
+
+Советчик работает с копией файла базы: обход и замеры не держат
+блокировку записи боевой базы, а правки маршрутов остаются в копии.
+Маршруты, GET которых меняет данные (``STATE_CHANGING``), не обходятся:
+они пишут и за пределы базы, например в журнал графа подписок.
+Маршруты обходятся тестовым клиентом, каждая форма SELECT проверяется
+через ``EXPLAIN QUERY PLAN``: полный просмотр таблицы и временное
+B-дерево для сортировки считаются проблемой. Для такой таблицы из WHERE
+и ORDER BY собирается индекс-кандидат; он создаётся в транзакции, план
+и время запроса замеряются до и после, затем индекс откатывается.
+"""
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from contextlib import closing, contextmanager
+from statistics import median
+from time import perf_counter
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import Client
+
+from core.query_budget import shape
+from core.routes import STATE_CHANGING, collect, heaviest, read
+
+CANDIDATE = 'index_advisor_candidate'
+MAX_COLUMNS = 4
+# Без исправленного плана кандидат предлагается, только если запрос
+# стал быстрее хотя бы на столько: мелкие разницы — шум замера
+MIN_SPEEDUP = 0.8
+SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$')
+TEMP_SORT = 'USE TEMP B-TREE FOR'
+TABLE_REF = re.compile(
+    r'(?:FROM|JOIN)\s+"?(\w+)"?(?:\s+(?:AS\s+)?"?(\w+)"?)?', re.IGNORECASE)
+NOT_ALIASES = {'INNER', 'LEFT', 'OUTER', 'CROSS', 'JOIN', 'WHERE', 'ON',
+               'ORDER', 'GROUP', 'LIMIT', 'USING', 'NATURAL'}
+
+
+class Query:
+    def __init__(self, sql, params, route):
+        self.sql = sql
+        self.params = params
+        self.routes = [route]
+
+
+class Collector:
+    """``execute_wrapper``: первый экземпляр каждой формы SELECT."""
+
+    def __init__(self):
+        self.queries = {}
+        self.route = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if (self.route is not None and not many
+                and sql.lstrip().upper().startswith('SELECT')):
+            query = self.queries.get(shape(sql))
+            if query is None:
+                self.queries[shape(sql)] = Query(
+                    sql, tuple(params or ()), self.route)
+            elif self.route not in query.routes:
+                query.routes.append(self.route)
+        return execute(sql, params, many, context)
+
+
+class Finding:
+    def __init__(self, query, plan, problems):
+        self.query = query
+        self.plan = plan
+        self.problems = problems
+        self.table = None
+        self.columns = []
+        self.proposal = None
+        self.plan_after = None
+        self.before_ms = None
+        self.after_ms = None
+
+    @property
+    def improved(self):
+        return self.plan_after is not None and not problems_in(
+            self.plan_after, aliases(self.query.sql), self.table)
+
+
+def crawl(names=None):
+    """Обходит маршруты от лица самого нагруженного пользователя."""
+    viewer, values = heaviest()
+    client = Client()
+    client.force_login(viewer)
+    collector = Collector()
+    failed = {}
+    with connection.execute_wrapper(collector):
+        for route in collect(values):
+            if route.name in STATE_CHANGING or (
+                    names and route.name not in names):
+                continue
+            collector.route = route.name
+            try:
+                with transaction.atomic():
+                    read(client.get(route.url))
+            except Exception as error:
+                # Упавший view не должен обрывать обход остальных
+                failed[route.name] = repr(error)
+            collector.route = None
+            # Маршрут мог разлогинить клиента
+            client.force_login(viewer)
+    return list(collector.queries.values()), failed
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def timed(sql, params, repeat):
+    """Медиана времени выполнения запроса в миллисекундах."""
+    samples = []
+    with connection.cursor() as cursor:
+        for _ in range(repeat):
+            start = perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            samples.append((perf_counter() - start) * 1000)
+    return round(median(samples), 3)
+
+
+def aliases(sql):
+    """Имя или псевдоним в плане -> таблица."""
+    tables = set(connection.introspection.table_names())
+    result = {}
+    for table, alias in TABLE_REF.findall(sql):
+        if table not in tables:
+            continue
+        result[table] = table
+        if alias and alias.upper() not in NOT_ALIASES:
+            result[alias] = table
+    return result
+
+
+def main_table(sql):
+    match = TABLE_REF.search(sql)
+    return match.group(1) if match else None
+
+
+def problems_in(plan, names, table=None):
+    """Пары (проблема, таблица) плана; ``table`` сужает поиск."""
+    found = []
+    for detail in plan:
+        match = SCAN.match(detail)
+        if match and (match.group(2) or match.group(1)) in names:
+            scanned = names[match.group(2) or match.group(1)]
+            found.append(('scan', scanned))
+        elif detail.startswith(TEMP_SORT):
+            found.append(('sort', None))
+    if table is not None:
+        found = [(kind, name) for kind, name in found
+                 if name in (table, None)]
+    return found
+
+
+def references(names):
+    quoted = '|'.join(re.escape(name) for name in names)
+    return rf'"?(?:{quoted})"?\."(\w+)"'
+
+
+def candidate_columns(sql, table, names, ordered):
+    """Столбцы индекса: сначала равенства, затем сортировка или диапазон.
+
+    Первичный ключ по возрастанию в конце отбрасывается: SQLite и так
+    хранит rowid в конце каждого индекса. По убыванию он остаётся, иначе
+    сортировка по нему снова уйдёт во временное B-дерево.
+    """
+    own = [name for name, target in names.items() if target == table]
+    ref = references(own)
+    head, _, order = sql.rpartition(' ORDER BY ')
+    if not head:
+        head, order = sql, ''
+    order = re.split(r' LIMIT ', order)[0]
+    columns = []
+    # Только сравнения с параметрами: условия JOIN индекс не сужают
+    for column in re.findall(rf'{ref} (?:= %s|IN \(%s|IS NULL)', head):
+        if (column, '') not in columns:
+            columns.append((column, ''))
+    tail = []
+    if ordered:
+        tail = [(column, 'DESC' if direction == 'DESC' else '')
+                for column, direction in re.findall(
+                    rf'{ref} (ASC|DESC)', order)]
+    if not tail:
+        tail = [(column, '') for column in re.findall(
+            rf'{ref} (?:<|>|<=|>=) %s', head)][:1]
+    for column, direction in tail:
+        if column not in [name for name, _ in columns]:
+            columns.append((column, direction))
+    model = model_for(table)
+    pk = model._meta.pk.column if model else 'id'
+    while columns and columns[-1] == (pk, ''):
+        columns.pop()
+    return columns[:MAX_COLUMNS]
+
+
+def model_for(table):
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            return model
+    return None
+
+
+def covered(table, columns):
+    """Есть ли уже индекс, который начинается с этих столбцов."""
+    wanted = [column for column, _ in columns]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return any(
+        info['columns'][:len(wanted)] == wanted
+        for info in constraints.values()
+        if info['index'] or info['unique'] or info['primary_key']
+    )
+
+
+def meta_index(table, columns):
+    """Строка для ``Meta.indexes`` модели таблицы."""
+    model = model_for(table)
+    if model is None:
+        sql = ', '.join(f'{column} {direction}'.strip()
+                        for column, direction in columns)
+        return f'CREATE INDEX ... ON {table} ({sql})'
+    by_column = {field.column: field.name
+                 for field in model._meta.concrete_fields}
+    fields = [('-' if direction else '') + by_column.get(column, column)
+              for column, direction in columns]
+    bare = '_'.join(field.lstrip('-') for field in fields)
+    name = f'{model._meta.model_name}_{bare}'[:26] + '_idx'
+    return (f'{model._meta.label}: models.Index(fields={fields!r}, '
+            f'name={name!r})')
+
+
+def try_candidate(finding, repeat):
+    """Создаёт индекс-кандидат, замеряет запрос и откатывает индекс."""
+    quote = connection.ops.quote_name
+    columns = ', '.join(f'{quote(column)} {direction}'.strip()
+                        for column, direction in finding.columns)
+    query = finding.query
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE INDEX {quote(CANDIDATE)} '
+                f'ON {quote(finding.table)} ({columns})')
+        finding.plan_after = explain(query.sql, query.params)
+        finding.after_ms = timed(query.sql, query.params, repeat)
+        transaction.set_rollback(True)
+
+
+def analyze(query, repeat):
+    names = aliases(query.sql)
+    plan = explain(query.sql, query.params)
+    problems = problems_in(plan, names)
+    if not problems:
+        return None
+    finding = Finding(query, plan, problems)
+    finding.before_ms = timed(query.sql, query.params, repeat)
+    scanned = [table for kind, table in problems if kind == 'scan']
+    finding.table = scanned[0] if scanned else main_table(query.sql)
+    ordered = finding.table == main_table(query.sql)
+    finding.columns = candidate_columns(
+        query.sql, finding.table, names, ordered)
+    if finding.columns and not covered(finding.table, finding.columns):
+        try_candidate(finding, repeat)
+        if finding.improved or (
+                finding.after_ms <= finding.before_ms * MIN_SPEEDUP):
+            finding.proposal = meta_index(finding.table, finding.columns)
+    return finding
+
+
+@contextmanager
+def database_copy():
+    """Подменяет соединение ``default`` соединением с копией базы.
+
+    Копия снимается backup API SQLite: чтение снимка не мешает
+    писателям. Исходное соединение не закрывается и после работы
+    возвращается на место.
+    """
+    directory = tempfile.mkdtemp(prefix='yatube-advisor-')
+    original = connections[DEFAULT_DB_ALIAS]
+    original.ensure_connection()
+    path = os.path.join(directory, 'copy.sqlite3')
+    with closing(sqlite3.connect(path)) as target:
+        original.connection.backup(target)
+    copy = original.__class__(
+        {**original.settings_dict, 'NAME': path}, DEFAULT_DB_ALIAS)
+    setattr(connections._connections, DEFAULT_DB_ALIAS, copy)
+    try:
+        yield
+    finally:
+        copy.close()
+        setattr(connections._connections, DEFAULT_DB_ALIAS, original)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def advise(names=None, repeat=20):
+    """Находки по запросам маршрутов и упавшие маршруты.
+
+    Всё делается на копии, база после работы не меняется.
+    """
+    with database_copy():
+        queries, failed = crawl(names)
+        findings = [finding for finding in (
+            analyze(query, repeat) for query in queries) if finding]
+    return findings, failed
@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import index_advisor
+from posts.models import Group, Post
+
+User = get_user_model()
+
+SQL_PREVIEW = 300
+
+
+class Command(BaseCommand):
+    help = ('Обходит страницы, проверяет их запросы через EXPLAIN QUERY '
+            'PLAN и предлагает индексы для Meta.indexes')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--route', action='append', dest='routes',
+            help='Проверить только этот маршрут, например posts:index; '
+                 'можно повторять')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнять запрос для замера до и после')
+
+    def handle(self, *args, **options):
+        if not (User.objects.exists() and Group.objects.exists()
+                and Post.objects.exists()):
+            raise CommandError(
+                'В базе нет пользователей, групп или постов: заполните её, '
+                'например, командой seed_yatube')
+        findings, failed = index_advisor.advise(
+            options['routes'], max(options['repeat'], 1))
+        for route, error in failed.items():
+            self.stderr.write(f'{route}: {error}')
+        proposals = []
+        for finding in findings:
+            self.report(finding)
+            if finding.proposal and finding.proposal not in proposals:
+                proposals.append(finding.proposal)
+        self.stdout.write(f'Запросов с проблемами: {len(findings)}')
+        if not proposals:
+            self.stdout.write(self.style.SUCCESS('Новых индексов не нужно'))
+            return
+        self.stdout.write(self.style.WARNING('Предлагаемые индексы:'))
+        for proposal in proposals:
+            self.stdout.write(f'  {proposal}')
+
+    def report(self, finding):
+        query = finding.query
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            ', '.join(query.routes)))
+        self.stdout.write(f'  {query.sql[:SQL_PREVIEW]}')
+        self.stdout.write(f'  План: {"; ".join(finding.plan)}')
+        self.stdout.write(f'  Время: {finding.before_ms} мс')
+        if finding.plan_after is None:
+            reason = ('индекс с такими столбцами уже есть' if finding.columns
+                      else 'нет столбцов для индекса')
+            self.stdout.write(f'  Кандидата нет: {reason}')
+            return
+        self.stdout.write(
+            f'  С индексом: {finding.after_ms} мс, '
+            f'план: {"; ".join(finding.plan_after)}')
+        if finding.proposal:
+            self.stdout.write(self.style.WARNING(
+                f'  Предложение: {finding.proposal}'))
@@ -0,0 +1,37 @@
+import logging
+
+from django.conf import settings
+
+from core.query_budget import QueryBudgetExceeded, QueryRecorder, budget_for
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы каждого запроса и сверяет их с бюджетом view.
+
+    Повторяющиеся формы запросов (N+1) и превышение бюджета из
+    ``settings.QUERY_BUDGETS`` пишутся в лог; при
+    ``QUERY_BUDGET_RAISE = True`` превышение бюджета — исключение.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is None:
+            return response
+        view_name = match.view_name
+        for sql, times in recorder.repeated():
+            logger.warning('%s: %s× повторён запрос %s', view_name, times, sql)
+        try:
+            recorder.check(budget_for(view_name), view_name)
+        except QueryBudgetExceeded as error:
+            if settings.QUERY_BUDGET_RAISE:
+                raise
+            logger.warning('%s', error)
+        return response
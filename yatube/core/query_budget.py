@@ -0,0 +1,74 @@
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+# Списки IN (%s, %s, ...) разной длины считаются одной формой запроса.
+PLACEHOLDERS = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """View выполнил больше SQL-запросов, чем ему разрешено."""
+
+
+def shape(sql):
+    return PLACEHOLDERS.sub('(%s...)', sql)
+
+
+def budget_for(view_name):
+    return settings.QUERY_BUDGETS.get(view_name)
+
+
+class QueryRecorder:
+    """Обёртка ``execute_wrapper``: запоминает формы всех запросов."""
+
+    def __init__(self):
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.shapes[shape(sql)] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return sum(self.shapes.values())
+
+    def repeated(self, limit=None):
+        """Формы, повторённые больше ``limit`` раз, — признак N+1."""
+        if limit is None:
+            limit = settings.QUERY_REPEAT_LIMIT
+        return [(sql, times) for sql, times in self.shapes.most_common()
+                if times > limit]
+
+    def report(self, label, budget):
+        lines = [f'{label}: {self.count} запросов при бюджете {budget}']
+        lines.extend(f'  {times}× {sql}' for sql, times in self.repeated(1))
+        return '\n'.join(lines)
+
+    def check(self, budget, label='view'):
+        if budget is not None and self.count > budget:
+            raise QueryBudgetExceeded(self.report(label, budget))
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+@contextmanager
+def assert_query_budget(budget):
+    """Тестовый помощник: падает, если блок превысил бюджет запросов.
+
+    ``budget`` — число или имя view из ``settings.QUERY_BUDGETS``.
+    """
+    label = 'block'
+    if isinstance(budget, str):
+        label, budget = budget, budget_for(budget)
+    recorder = QueryRecorder()
+    with recorder.record():
+        yield recorder
+    recorder.check(budget, label)
@@ -0,0 +1,86 @@
+import re
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.db.models import Count
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlencode, urlsafe_base64_encode
+
+from about import urls as about_urls
+from posts import urls as posts_urls
+from posts.models import Group, Post
+from users import urls as users_urls
+
+User = get_user_model()
+
+URLCONFS = (posts_urls, users_urls, about_urls)
+# Редактировать можно только свой пост, иначе замеряется редирект
+OWN_POST = {'posts:post_edit', 'posts:edit'}
+# View страницы 404 ждёт исключение и по своему URL всегда падает
+SKIPPED = {'posts:404'}
+# Поиск без q отдаёт пустую форму: ищется слово из поста
+SEARCH = 'posts:search'
+# GET этих маршрутов меняет данные: подписка, отписка, выход
+STATE_CHANGING = {
+    'posts:profile_follow', 'posts:profile_unfollow', 'users:logout'}
+
+Route = namedtuple('Route', 'name url')
+
+
+def heaviest():
+    """Объекты, на которых страницы рендерятся дольше всего.
+
+    Зритель — пользователь с самой длинной лентой подписок, автор —
+    другой пользователь с наибольшим числом постов, пост — самый
+    комментируемый, поисковый запрос — самое длинное слово этого поста.
+    """
+    viewer = User.objects.order_by(
+        '-counters__following_count', 'pk').first()
+    author = User.objects.exclude(pk=viewer.pk).order_by(
+        '-counters__post_count', 'pk').first()
+    group = Group.objects.annotate(
+        total=Count('posts')).order_by('-total', 'pk').first()
+    post = Post.objects.order_by('-comment_count', '-pk').first()
+    own = viewer.posts.order_by('-pk').first() or post
+    thread = post.comments.filter(depth=0).order_by('path').first()
+    words = re.findall(r'\w+', post.text)
+    return viewer, {
+        'slug': group.slug,
+        'username': author.username,
+        'post_id': post.pk,
+        'own_post_id': own.pk,
+        'comment_id': thread.pk if thread else 0,
+        'feed_format': 'atom',
+        'name': 'posts',
+        'uidb64': urlsafe_base64_encode(force_bytes(viewer.pk)),
+        'token': default_token_generator.make_token(viewer),
+        'query': max(words, key=len) if words else 'пост',
+    }
+
+
+def collect(values):
+    """Все именованные маршруты приложений с подставленными аргументами."""
+    routes = []
+    for urlconf in URLCONFS:
+        for pattern in urlconf.urlpatterns:
+            name = f'{urlconf.app_name}:{pattern.name}'
+            if name in SKIPPED:
+                continue
+            kwargs = {key: values[key]
+                      for key in pattern.pattern.converters}
+            if name in OWN_POST:
+                kwargs['post_id'] = values['own_post_id']
+            url = reverse(name, kwargs=kwargs)
+            if name == SEARCH:
+                url = f'{url}?{urlencode({"q": values["query"]})}'
+            routes.append(Route(name, url))
+    return routes
+
+
+def read(response):
+    """Тело ответа; потоковый ответ строится при чтении."""
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
@@ -1,6 +1,18 @@
 from http import HTTPStatus
 
-from django.test import Client, TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from core import index_advisor
+from core.query_budget import QueryBudgetExceeded, assert_query_budget
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -11,3 +23,112 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:index': 0}, QUERY_BUDGET_RAISE=True)
+    def test_over_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('posts:index'))
+
+    @override_settings(QUERY_BUDGETS={'posts:index': 0})
+    def test_over_budget_is_logged(self):
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+
+    def test_repeated_shapes_are_grouped(self):
+        user = User.objects.create_user(username='UserName')
+        with self.assertRaises(QueryBudgetExceeded) as error:
+            with assert_query_budget(1) as recorder:
+                for pk in range(4):
+                    User.objects.filter(pk__in=range(pk + 1)).exists()
+                User.objects.get(pk=user.pk)
+        self.assertEqual(len(recorder.repeated(limit=3)), 1)
+        self.assertIn('4×', str(error.exception))
+
+
+class IndexAdvisorTest(TransactionTestCase):
+    """Без общей транзакции теста: копия базы снимается backup API."""
+
+    def indexes(self):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(
+                cursor, Post._meta.db_table))
+
+    def test_empty_database(self):
+        with self.assertRaises(CommandError):
+            call_command('index_advisor')
+
+    def test_proposes_group_index_and_rolls_back(self):
+        author = User.objects.create_user(username='author')
+        User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=author, group=group)
+            for number in range(30))
+        # Индекс уже есть в Meta: без него советчику есть что предложить
+        index = next(index for index in Post._meta.indexes
+                     if index.name == 'post_group_pub_date_idx')
+        with connection.schema_editor() as editor:
+            editor.remove_index(Post, index)
+        self.addCleanup(self.restore_index, index)
+        before = self.indexes()
+        findings, failed = index_advisor.advise(
+            ['posts:group_list'], repeat=1)
+        self.assertEqual(failed, {})
+        proposals = [finding.proposal for finding in findings]
+        self.assertTrue(any(
+            "fields=['group', '-pub_date', '-id']" in (proposal or '')
+            for proposal in proposals), proposals)
+        self.assertEqual(self.indexes(), before)
+
+    def restore_index(self, index):
+        with connection.schema_editor() as editor:
+            editor.add_index(Post, index)
+
+    def test_state_changing_routes_are_skipped(self):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(text='Пост', author=author, group=group)
+        findings, failed = index_advisor.advise(
+            ['posts:profile_follow', 'posts:profile_unfollow',
+             'users:logout'], repeat=1)
+        self.assertEqual((findings, failed), ([], {}))
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_crawl_changes_only_the_copy(self):
+        author = User.objects.create_user(username='author')
+        User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(text='Пост', author=author, group=group)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM django_session')
+            sessions = cursor.fetchone()[0]
+        index_advisor.advise(['posts:index'], repeat=1)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM django_session')
+            self.assertEqual(cursor.fetchone()[0], sessions)
+
+
+class SQLiteBackendTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_set(self):
+        # NORMAL
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+    def test_transactions_take_write_lock_at_once(self):
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
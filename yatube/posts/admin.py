@@ -1,12 +1,32 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.auth import get_user_model
 
+from . import graph, search
 from .models import Group, Post, Comment, Follow
 
+User = get_user_model()
 
-class PostAdmin(admin.ModelAdmin):
+
+class FullTextSearchMixin:
+    """Поиск в списке объектов по индексу FTS5 вместо LIKE '%q%'."""
+    search_index = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.enabled():
+            return super().get_search_results(
+                request, queryset, search_term)
+        if not search.match_expression(search_term):
+            return queryset.none(), False
+        return queryset.filter(pk__in=search.matching_ids(
+            self.search_index, search_term)), False
+
+
+class PostAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
     search_fields = ('text',)
+    search_index = search.POST_INDEX
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
@@ -17,15 +37,62 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('post', 'author', 'text', 'created', 'active')
     list_filter = ('active', 'text', 'created', 'updated')
-    search_fields = ('post', 'author', 'text')
+    search_fields = ('text',)
+    search_index = search.COMMENT_INDEX
+
+
+class FollowGraphFilter(admin.SimpleListFilter):
+    """Фильтр по самым активным участникам подписок из графа в памяти.
+
+    В списке только ``FOLLOW_ADMIN_FILTER_SIZE`` человек с наибольшим
+    числом подписок (подписчиков) и выбранный сейчас; любого другого
+    можно выбрать, подставив его id в адрес.
+    """
+    field = None
+
+    def top(self, follows, count):
+        raise NotImplementedError
+
+    def lookups(self, request, model_admin):
+        follows = graph.get()
+        ids = self.top(follows, settings.FOLLOW_ADMIN_FILTER_SIZE)
+        if self.value() and self.value().isdigit():
+            ids.append(int(self.value()))
+        names = dict(User.objects.filter(pk__in=ids).values_list(
+            'pk', 'username'))
+        return [(user_id, names[user_id]) for user_id in dict.fromkeys(ids)
+                if user_id in names]
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return queryset.filter(**{f'{self.field}_id': self.value()})
+        return queryset
+
+
+class FollowerFilter(FollowGraphFilter):
+    title = 'Пользователь'
+    parameter_name = 'user'
+    field = 'user'
+
+    def top(self, follows, count):
+        return follows.most_following(count)
+
+
+class AuthorFilter(FollowGraphFilter):
+    title = 'Автор'
+    parameter_name = 'author'
+    field = 'author'
+
+    def top(self, follows, count):
+        return follows.most_followed(count)
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
-    list_filter = ('user', 'author')
+    list_filter = (FollowerFilter, AuthorFilter)
     search_fields = ('user', 'author')
 
 
@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db.models import F
+
+from .models import CacheScope
+
+GLOBAL = 'global'
+
+# Строки областей, прочитанные за время текущего запроса: валидаторы
+# страницы и фрагменты шаблона берут поколение одним запросом к базе
+_request = threading.local()
+
+
+def _start(**kwargs):
+    _request.scopes = {}
+
+
+def _finish(**kwargs):
+    _request.scopes = None
+
+
+request_started.connect(_start)
+request_finished.connect(_finish)
+
+
+def _seed():
+    # Новая строка стартует со случайного поколения, а не с единицы:
+    # удалённая область не вернётся к старому поколению фрагментов.
+    return random.getrandbits(48)
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scopes(author_id, group_id=None):
+    scopes = [GLOBAL, author_scope(author_id)]
+    if group_id is not None:
+        scopes.append(group_scope(group_id))
+    return scopes
+
+
+def _create(scopes):
+    CacheScope.objects.bulk_create(
+        [CacheScope(scope=scope, generation=_seed(), modified=time.time())
+         for scope in scopes],
+        ignore_conflicts=True,
+    )
+
+
+def _rows(scopes):
+    """Область -> (поколение, время изменения), одним запросом.
+
+    Чтение ничего не пишет: области без строки ещё не менялись, их
+    поколение — ноль. Строку создаёт первый ``bump`` или ``touch``.
+    """
+    known = getattr(_request, 'scopes', None)
+    rows = {} if known is None else known
+    missing = [scope for scope in scopes if scope not in rows]
+    if missing:
+        rows.update(dict.fromkeys(missing, (0, 0.0)))
+        rows.update({scope: (value, stamp) for scope, value, stamp in (
+            CacheScope.objects.filter(scope__in=missing)
+            .values_list('scope', 'generation', 'modified'))})
+    return [rows[scope] for scope in scopes]
+
+
+def _forget(scopes):
+    known = getattr(_request, 'scopes', None)
+    for scope in known and scopes or ():
+        known.pop(scope, None)
+
+
+def generation(*scopes):
+    """Версия кеша для набора областей: строка из их счётчиков."""
+    return '.'.join(str(value) for value, _ in _rows(scopes))
+
+
+def bump(*scopes):
+    """Делает устаревшими все фрагменты областей одним UPDATE."""
+    rows = CacheScope.objects.filter(scope__in=scopes)
+    if rows.update(generation=F('generation') + 1,
+                   modified=time.time()) < len(set(scopes)):
+        _create(scopes)
+    _forget(scopes)
+
+
+def touch(*scopes):
+    """Запоминает время изменения областей, не трогая поколения."""
+    rows = CacheScope.objects.filter(scope__in=scopes)
+    if rows.update(modified=time.time()) < len(set(scopes)):
+        _create(scopes)
+    _forget(scopes)
+
+
+def modified(*scopes):
+    """Время последнего изменения областей (unix time)."""
+    return max(stamp for _, stamp in _rows(scopes))
+
+
+def fragment_context(*scopes):
+    return {
+        'feed_version': generation(*scopes),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
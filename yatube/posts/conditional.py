@@ -0,0 +1,135 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import caching
+from .models import Group, Post
+
+User = get_user_model()
+
+COUNTERS = (
+    'counters__post_count',
+    'counters__follower_count',
+    'counters__following_count',
+)
+
+
+class State:
+    """Всё, от чего зависит страница, без её рендера.
+
+    ``scopes`` — области кеша (их поколения и время изменения),
+    ``parts`` — значения из базы, ``last_modified`` — дата из базы, если
+    она позже изменения областей (публикация поста), ``obj`` — объект
+    страницы, если он уже прочитан: view берёт его через ``page_object``.
+    """
+
+    def __init__(self, scopes, parts, last_modified=None, obj=None):
+        self.scopes = scopes
+        self.parts = parts
+        self.last_modified = last_modified
+        self.obj = obj
+
+
+def index_state(**kwargs):
+    last = Post.objects.aggregate(last=Max('pub_date'))['last']
+    return State([caching.GLOBAL], [last], last)
+
+
+# Группа, автор и пост читаются одной строкой, без агрегатов по постам
+# и комментариям: их сохранение и удаление меняют поколение области.
+
+
+def group_state(slug, **kwargs):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return None
+    parts = [group.pk, group.title, group.description]
+    return State([caching.group_scope(group.pk)], parts, obj=group)
+
+
+def profile_state(username, **kwargs):
+    author = User.objects.filter(username=username).select_related(
+        'counters').first()
+    if author is None:
+        return None
+    counters = getattr(author, 'counters', None)
+    parts = [author.pk, *(
+        getattr(counters, name.split('__')[1], None) for name in COUNTERS)]
+    return State([caching.author_scope(author.pk)], parts, obj=author)
+
+
+def post_state(post_id, **kwargs):
+    post = Post.objects.filter(pk=post_id).values_list(
+        'pub_date', 'comment_count', 'author_id', 'group_id',
+        *(f'author__{name}' for name in COUNTERS),
+    ).first()
+    if post is None:
+        return None
+    # Правка поста и комментариев меняет поколение области автора
+    return State([caching.author_scope(post[2])], post, post[0])
+
+
+def validators(request, state):
+    """ETag и Last-Modified страницы по её состоянию.
+
+    Страница зависит от пользователя и параметров запроса (курсора),
+    поэтому они входят в ETag. Last-Modified не раньше времени
+    изменения областей: правка не меняет даты публикации.
+    """
+    if state is None:
+        return None, None
+    user = request.user.pk if request.user.is_authenticated else ''
+    raw = '|'.join(str(part) for part in (
+        user, request.get_full_path(), caching.generation(*state.scopes),
+        *state.parts))
+    etag = hashlib.md5(raw.encode()).hexdigest()
+    last_modified = datetime.fromtimestamp(
+        caching.modified(*state.scopes), timezone.utc)
+    if state.last_modified is not None:
+        last_modified = max(last_modified, state.last_modified)
+    return etag, last_modified
+
+
+def page_object(request):
+    """Объект страницы, прочитанный ``conditional_page``, или None."""
+    state = getattr(request, '_page_state', None)
+    return state and state.obj
+
+
+def conditional_page(state_func):
+    """Отвечает 304 на условный GET, если страница не менялась.
+
+    ``state_func`` получает аргументы view из URL (лишние, вроде формата
+    ленты, может пропускать) и возвращает ``State`` или None, если
+    объекта нет: тогда view отвечает сама. Валидаторы считаются
+    одним-двумя запросами до вызова view, так что при совпадении
+    If-None-Match/If-Modified-Since шаблоны не рендерятся.
+    Ответ помечается ``private, no-cache``: браузер хранит страницу,
+    но каждый раз перепроверяет её.
+    """
+    def computed(request, *args, **kwargs):
+        if not hasattr(request, '_page_validators'):
+            request._page_state = state_func(*args, **kwargs)
+            request._page_validators = validators(
+                request, request._page_state)
+        return request._page_validators
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=lambda *args, **kwargs: computed(*args, **kwargs)[0],
+            last_modified_func=(
+                lambda *args, **kwargs: computed(*args, **kwargs)[1]),
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
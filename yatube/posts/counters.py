@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorCounters, Comment, Follow, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+
+def _change(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_author(user_id, field, delta):
+    """Атомарно сдвигает счётчик пользователя, создавая строку при нужде."""
+    counters = AuthorCounters.objects.filter(user_id=user_id)
+    if not _change(counters, field, delta) and delta > 0:
+        AuthorCounters.objects.get_or_create(user_id=user_id)
+        _change(counters, field, delta)
+
+
+def change_comments(post_id, delta):
+    _change(Post.objects.filter(pk=post_id), 'comment_count', delta)
+
+
+def count_of(model, field, outer='pk'):
+    """Подзапрос COUNT(*) строк ``model``, ссылающихся на внешнюю строку."""
+    counted = (
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def _batches(queryset, field, batch_size):
+    top = queryset.aggregate(top=Max(field))['top'] or 0
+    for start in range(0, top + 1, batch_size):
+        yield queryset.filter(**{
+            f'{field}__gte': start,
+            f'{field}__lt': start + batch_size,
+        })
+
+
+def reconcile(batch_size=BATCH_SIZE):
+    """Пересчитывает все счётчики диапазонами первичного ключа.
+
+    Каждый диапазон обновляется одним UPDATE с подзапросами в своей
+    транзакции, поэтому таблицы не блокируются на всё время пересчёта.
+    """
+    for users in _batches(User.objects.all(), 'pk', batch_size):
+        with transaction.atomic():
+            AuthorCounters.objects.bulk_create(
+                [AuthorCounters(user_id=pk) for pk in users.filter(
+                    counters__isnull=True).values_list('pk', flat=True)],
+                ignore_conflicts=True,
+            )
+    for counters in _batches(
+            AuthorCounters.objects.all(), 'user_id', batch_size):
+        with transaction.atomic():
+            counters.update(
+                post_count=count_of(Post, 'author', 'user_id'),
+                follower_count=count_of(Follow, 'author', 'user_id'),
+                following_count=count_of(Follow, 'user', 'user_id'),
+            )
+    for posts in _batches(Post.objects.all(), 'pk', batch_size):
+        with transaction.atomic():
+            posts.update(comment_count=count_of(Comment, 'post'))
@@ -0,0 +1,98 @@
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Follow, Group, Post
+
+BATCH_SIZE = 2000
+
+MODELS = {
+    'posts': Post,
+    'comments': Comment,
+    'follows': Follow,
+    'groups': Group,
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def rows(model, fields, batch_size=BATCH_SIZE):
+    """Строки таблицы порциями по первичному ключу.
+
+    Каждая порция — отдельный запрос ``pk > последний``: ни курсор,
+    ни OFFSET не держатся открытыми, память не растёт с размером таблицы.
+    """
+    queryset = model.objects.order_by('pk').values_list('pk', *fields)
+    last = None
+    while True:
+        batch = queryset if last is None else queryset.filter(pk__gt=last)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return
+        last = batch[-1][0]
+        for row in batch:
+            yield row[1:]
+
+
+def ndjson_lines(fields, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+class Line:
+    """Псевдофайл для csv.writer: ``write`` возвращает строку как есть."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(fields, rows):
+    writer = csv.writer(Line())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def encode(lines, batch_lines=100):
+    """Строки -> куски байт по ``batch_lines`` строк."""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= batch_lines:
+            yield ''.join(chunk).encode()
+            chunk = []
+    if chunk:
+        yield ''.join(chunk).encode()
+
+
+def gzip_chunks(chunks):
+    """Сжимает поток кусков в формат gzip на лету."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export(name, output_format='ndjson', compress=False,
+           batch_size=BATCH_SIZE):
+    """Выгрузка таблицы ``name`` из ``MODELS`` потоком кусков байт."""
+    model = MODELS[name]
+    fields = columns(model)
+    lines = {'ndjson': ndjson_lines, 'csv': csv_lines}[output_format](
+        fields, rows(model, fields, batch_size))
+    chunks = encode(lines)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def filename(name, output_format, compress=False):
+    return f'{name}.{output_format}' + ('.gz' if compress else '')
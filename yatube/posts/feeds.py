@@ -0,0 +1,134 @@
+from io import StringIO
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.text import Truncator
+from django.utils.xmlutils import SimplerXMLGenerator
+
+from . import caching
+
+TITLE_LENGTH = 60
+
+
+class StreamingFeedMixin:
+    """Лента, которая пишется кусками: шапка, по куску на запись, хвост.
+
+    Записи берутся из итератора по одной, так что в памяти не держится
+    ни весь список, ни весь документ.
+    """
+
+    def latest_post_date(self):
+        return self.feed.get('updated') or super().latest_post_date()
+
+    def stream(self, items):
+        buffer = StringIO()
+        handler = SimplerXMLGenerator(buffer, 'utf-8')
+        handler.startDocument()
+        self.start_document(handler)
+        yield flush(buffer)
+        for item in items:
+            self.add_item(**item)
+            self.write_items(handler)
+            self.items.clear()
+            yield flush(buffer)
+        self.end_document(handler)
+        yield flush(buffer)
+
+
+class AtomFeed(StreamingFeedMixin, Atom1Feed):
+    def start_document(self, handler):
+        handler.startElement('feed', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end_document(self, handler):
+        handler.endElement('feed')
+
+
+class RssFeed(StreamingFeedMixin, Rss201rev2Feed):
+    def start_document(self, handler):
+        handler.startElement('rss', self.rss_attributes())
+        handler.startElement('channel', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end_document(self, handler):
+        self.endChannelElement(handler)
+        handler.endElement('rss')
+
+
+FORMATS = {'atom': AtomFeed, 'rss': RssFeed}
+
+
+def flush(buffer):
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return chunk.encode()
+
+
+def entries(request, posts):
+    """Записи ленты из не более ``FEED_SIZE`` последних постов."""
+    rows = posts.order_by('-pub_date', '-pk').values(
+        'pk', 'text', 'pub_date', 'author__username', 'group__title',
+    )[:settings.FEED_SIZE]
+    for row in rows.iterator():
+        link = request.build_absolute_uri(
+            reverse('posts:post_detail', kwargs={'post_id': row['pk']}))
+        yield {
+            'title': Truncator(row['text']).chars(TITLE_LENGTH),
+            'link': link,
+            'unique_id': link,
+            'description': row['text'],
+            'pubdate': row['pub_date'],
+            'author_name': row['author__username'],
+            'categories': [row['group__title']] if row['group__title'] else (),
+        }
+
+
+def cache_key(request, scope):
+    # Абсолютные ссылки в ленте зависят от хоста
+    return (f'posts:feed:{request.get_host()}:{request.path}:'
+            f'{caching.generation(scope)}')
+
+
+def cached_stream(key, chunks):
+    """Отдаёт куски дальше и кеширует документ, если он дописан до конца."""
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(body), settings.FEED_CACHE_TIMEOUT)
+
+
+def feed_response(request, feed_format, scope, posts, title, link,
+                  description=''):
+    """Лента постов в формате ``feed_format`` ('atom' или 'rss').
+
+    Готовый документ кешируется под поколением области ``scope``, как
+    и HTML-списки, и сбрасывается теми же сигналами.
+    """
+    feed_class = FORMATS.get(feed_format)
+    if feed_class is None:
+        raise Http404
+    content_type = feed_class.content_type
+    key = cache_key(request, scope)
+    body = cache.get(key)
+    if body is not None:
+        return HttpResponse(body, content_type=content_type)
+    items = entries(request, posts)
+    first = next(items, None)
+    feed = feed_class(
+        title=title,
+        link=request.build_absolute_uri(link),
+        description=description,
+        language=settings.LANGUAGE_CODE,
+        feed_url=request.build_absolute_uri(request.path),
+        updated=first['pubdate'] if first else None,
+    )
+    if first is not None:
+        items = chain([first], items)
+    return StreamingHttpResponse(
+        cached_stream(key, feed.stream(items)), content_type=content_type)
@@ -0,0 +1,401 @@
+import heapq
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from functools import partial
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Follow, FollowVersion
+
+# Единственная строка FollowVersion: создаётся первой подпиской
+VERSION_ID = 1
+EMPTY = array('q')
+
+
+class Adjacency:
+    """Рёбра одного направления в формате CSR.
+
+    ``nodes`` — отсортированные id вершин с рёбрами, соседи вершины
+    ``nodes[i]`` — отсортированный срез ``targets[offsets[i]:offsets[i + 1]]``.
+    Поиск вершины и ребра — двоичный, без словарей и объектов на ребро.
+    """
+
+    def __init__(self, edges):
+        self.nodes = array('q')
+        self.offsets = array('q', [0])
+        self.targets = array('q')
+        for node, group in groupby(edges, itemgetter(0)):
+            self.nodes.append(node)
+            self.targets.extend(target for _, target in group)
+            self.offsets.append(len(self.targets))
+
+    def _bounds(self, node):
+        index = bisect_left(self.nodes, node)
+        if index == len(self.nodes) or self.nodes[index] != node:
+            return 0, 0
+        return self.offsets[index], self.offsets[index + 1]
+
+    def neighbours(self, node):
+        start, end = self._bounds(node)
+        return self.targets[start:end] if end else EMPTY
+
+    def degree(self, node):
+        start, end = self._bounds(node)
+        return end - start
+
+    def has(self, node, target):
+        start, end = self._bounds(node)
+        index = bisect_left(self.targets, target, start, end)
+        return index < end and self.targets[index] == target
+
+    def edges(self):
+        for index, node in enumerate(self.nodes):
+            for position in range(self.offsets[index],
+                                  self.offsets[index + 1]):
+                yield node, self.targets[position]
+
+
+class FollowGraph:
+    """Подписки ``(user_id, author_id)`` в обоих направлениях.
+
+    Основа неизменяема; подписки и отписки после загрузки копятся в
+    небольших наборах поверх неё и вливаются в новую основу, когда их
+    становится больше ``FOLLOW_GRAPH_COMPACT_SIZE``. Процесс правит
+    копию графа и подменяет ссылку, поэтому читатели без блокировок.
+    """
+
+    def __init__(self, pairs=()):
+        edges = sorted(set(pairs))
+        self._build(edges, sorted((author, user) for user, author in edges))
+
+    @classmethod
+    def from_sorted(cls, following, followers):
+        """Граф из двух потоков рёбер без повторов.
+
+        ``following`` — пары ``(user, author)``, ``followers`` — пары
+        ``(author, user)``, оба отсортированы. Пары не собираются в список:
+        числа сразу ложатся в массивы.
+        """
+        graph = cls.__new__(cls)
+        graph._build(following, followers)
+        return graph
+
+    def _build(self, following, followers):
+        self.following = Adjacency(following)
+        self.followers = Adjacency(followers)
+        self._reset()
+
+    def _reset(self):
+        self.added = set()
+        self.removed = set()
+        self.added_out = defaultdict(set)
+        self.added_in = defaultdict(set)
+        self.removed_out = defaultdict(set)
+        self.removed_in = defaultdict(set)
+
+    def follows(self, user_id, author_id):
+        pair = (user_id, author_id)
+        if pair in self.added:
+            return True
+        return (pair not in self.removed
+                and self.following.has(user_id, author_id))
+
+    def _merged(self, adjacency, node, added, removed):
+        base = adjacency.neighbours(node)
+        if node not in added and node not in removed:
+            return base
+        drop = removed.get(node, ())
+        return array('q', sorted(
+            {target for target in base if target not in drop}
+            | added.get(node, set())))
+
+    def following_ids(self, user_id):
+        """Отсортированные id авторов, на которых подписан пользователь."""
+        return self._merged(
+            self.following, user_id, self.added_out, self.removed_out)
+
+    def follower_ids(self, author_id):
+        """Отсортированные id подписчиков автора."""
+        return self._merged(
+            self.followers, author_id, self.added_in, self.removed_in)
+
+    def following_count(self, user_id):
+        return (self.following.degree(user_id)
+                + len(self.added_out.get(user_id, ()))
+                - len(self.removed_out.get(user_id, ())))
+
+    def follower_count(self, author_id):
+        return (self.followers.degree(author_id)
+                + len(self.added_in.get(author_id, ()))
+                - len(self.removed_in.get(author_id, ())))
+
+    def users(self):
+        """Id пользователей, у которых есть подписки."""
+        nodes = set(self.following.nodes) | self.added_out.keys()
+        return sorted(node for node in nodes if self.following_count(node))
+
+    def authors(self):
+        """Id авторов, у которых есть подписчики."""
+        nodes = set(self.followers.nodes) | self.added_in.keys()
+        return sorted(node for node in nodes if self.follower_count(node))
+
+    def most_following(self, count):
+        """Id ``count`` пользователей с наибольшим числом подписок."""
+        return heapq.nlargest(count, self.users(), key=self.following_count)
+
+    def most_followed(self, count):
+        """Id ``count`` авторов с наибольшим числом подписчиков."""
+        return heapq.nlargest(count, self.authors(), key=self.follower_count)
+
+    def _mark(self, pair, into, into_out, into_in):
+        user_id, author_id = pair
+        into.add(pair)
+        into_out[user_id].add(author_id)
+        into_in[author_id].add(user_id)
+
+    def _unmark(self, pair, into, into_out, into_in):
+        user_id, author_id = pair
+        into.discard(pair)
+        for index, node, target in ((into_out, user_id, author_id),
+                                    (into_in, author_id, user_id)):
+            index[node].discard(target)
+            if not index[node]:
+                del index[node]
+
+    def add(self, user_id, author_id):
+        pair = (user_id, author_id)
+        if pair in self.removed:
+            self._unmark(pair, self.removed, self.removed_out,
+                         self.removed_in)
+        elif not self.following.has(user_id, author_id):
+            self._mark(pair, self.added, self.added_out, self.added_in)
+
+    def remove(self, user_id, author_id):
+        pair = (user_id, author_id)
+        if pair in self.added:
+            self._unmark(pair, self.added, self.added_out, self.added_in)
+        elif self.following.has(user_id, author_id):
+            self._mark(pair, self.removed, self.removed_out,
+                       self.removed_in)
+
+    def copy(self):
+        """Граф с той же основой и копией изменений поверх неё."""
+        graph = FollowGraph.__new__(FollowGraph)
+        graph.following = self.following
+        graph.followers = self.followers
+        graph._reset()
+        for pair in self.added:
+            graph._mark(pair, graph.added, graph.added_out, graph.added_in)
+        for pair in self.removed:
+            graph._mark(pair, graph.removed, graph.removed_out,
+                        graph.removed_in)
+        return graph
+
+    def pending(self):
+        return len(self.added) + len(self.removed)
+
+    def _edges(self, adjacency, added, removed):
+        """Рёбра основы с изменениями поверх неё, по порядку."""
+        extra = sorted((node, target) for node, targets in added.items()
+                       for target in targets)
+        for node, target in heapq.merge(adjacency.edges(), extra):
+            if target not in removed.get(node, ()):
+                yield node, target
+
+    def compacted(self):
+        """Новый граф, в основу которого влиты накопленные изменения."""
+        return FollowGraph.from_sorted(
+            self._edges(self.following, self.added_out, self.removed_out),
+            self._edges(self.followers, self.added_in, self.removed_in))
+
+
+class _Loaded:
+    graph = None
+    # Последняя применённая версия и прочитанная часть журнала
+    version = 0
+    inode = None
+    offset = 0
+    # Правки, пришедшие раньше предыдущих по версии, и с каких пор
+    # предыдущей не хватает
+    waiting = {}
+    gap_since = None
+
+
+_loaded = _Loaded()
+_lock = threading.Lock()
+
+
+def version():
+    """Текущая версия подписок из базы."""
+    return FollowVersion.objects.filter(pk=VERSION_ID).values_list(
+        'version', flat=True).first() or 0
+
+
+def bump():
+    """Увеличивает версию подписок и возвращает новую.
+
+    Обновление и чтение идут в одной транзакции: строку версии до коммита
+    не может изменить никто другой, так что номер точно свой.
+    """
+    versions = FollowVersion.objects.filter(pk=VERSION_ID)
+    with transaction.atomic():
+        if not versions.update(version=F('version') + 1):
+            FollowVersion.objects.get_or_create(pk=VERSION_ID)
+            versions.update(version=F('version') + 1)
+        return version()
+
+
+def load():
+    """Версия подписок и граф, в котором есть все правки до неё.
+
+    Версия читается раньше подписок: граф может оказаться новее версии,
+    и тогда правки из журнала применятся к нему повторно, что ничего не
+    меняет. Рёбра идут из базы по индексам уже отсортированными.
+    """
+    current = version()
+    follows = Follow.objects.values_list
+    return current, FollowGraph.from_sorted(
+        follows('user_id', 'author_id').order_by(
+            'user_id', 'author_id').iterator(),
+        follows('author_id', 'user_id').order_by(
+            'author_id', 'user_id').iterator(),
+    )
+
+
+def _open_log():
+    return os.open(settings.FOLLOW_GRAPH_LOG,
+                   os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+
+def _stat():
+    try:
+        stat = os.stat(settings.FOLLOW_GRAPH_LOG)
+    except FileNotFoundError:
+        return None, 0
+    return stat.st_ino, stat.st_size
+
+
+def _reload():
+    # Журнал запоминается раньше чтения базы: всё, что в нём уже есть,
+    # закоммичено и попадёт в граф. Пустой журнал создаётся сразу, иначе
+    # его появление не отличить от начатого заново
+    os.close(_open_log())
+    _loaded.inode, _loaded.offset = _stat()
+    _loaded.version, _loaded.graph = load()
+    _loaded.waiting = {}
+    _loaded.gap_since = None
+
+
+def _read_log():
+    """Дочитывает журнал; False, если файл сменился и нужна перезагрузка."""
+    try:
+        log = open(settings.FOLLOW_GRAPH_LOG, 'rb')
+    except FileNotFoundError:
+        return False
+    with log:
+        if os.fstat(log.fileno()).st_ino != _loaded.inode:
+            return False
+        log.seek(_loaded.offset)
+        data = log.read()
+    # Последняя строка может быть ещё недописана
+    data = data[:data.rfind(b'\n') + 1]
+    _loaded.offset += len(data)
+    for line in data.splitlines():
+        number, user_id, author_id, followed = map(int, line.split())
+        if number > _loaded.version:
+            _loaded.waiting[number] = (user_id, author_id, followed)
+    return True
+
+
+def _catch_up():
+    if _loaded.graph is None or not _read_log():
+        _reload()
+        return
+    graph = None
+    while _loaded.version + 1 in _loaded.waiting:
+        user_id, author_id, followed = _loaded.waiting.pop(
+            _loaded.version + 1)
+        graph = graph or _loaded.graph.copy()
+        if followed:
+            graph.add(user_id, author_id)
+        else:
+            graph.remove(user_id, author_id)
+        _loaded.version += 1
+    if graph is not None:
+        if graph.pending() > settings.FOLLOW_GRAPH_COMPACT_SIZE:
+            graph = graph.compacted()
+        _loaded.graph = graph
+    if not _loaded.waiting:
+        _loaded.gap_since = None
+    elif _loaded.gap_since is None:
+        _loaded.gap_since = time.monotonic()
+    elif time.monotonic() - _loaded.gap_since >= (
+            settings.FOLLOW_GRAPH_LOG_WAIT):
+        # Процесс закоммитил правку, но не записал её в журнал
+        _reload()
+
+
+def get():
+    """Граф подписок процесса, догнанный по журналу правок.
+
+    Проверка свежести — ``os.stat`` журнала, без запросов к базе. Новые
+    строки журнала применяются к копии графа по порядку версий; граф
+    целиком перечитывается из базы, только если журнал начат заново.
+    Внутри транзакции граф строится заново и не запоминается: в нём
+    могут оказаться незакоммиченные подписки.
+    """
+    if connection.in_atomic_block:
+        return load()[1]
+    if (_loaded.graph is None or _loaded.waiting
+            or _stat() != (_loaded.inode, _loaded.offset)):
+        with _lock:
+            _catch_up()
+    return _loaded.graph
+
+
+def follows(user_id, author_id):
+    """Подписан ли пользователь на автора."""
+    if connection.in_atomic_block:
+        return Follow.objects.filter(
+            user_id=user_id, author_id=author_id).exists()
+    return get().follows(user_id, author_id)
+
+
+def append(number, user_id, author_id, followed):
+    """Дописывает правку в журнал одной записью в режиме O_APPEND."""
+    line = f'{number} {user_id} {author_id} {int(followed)}\n'.encode()
+    log = _open_log()
+    try:
+        os.write(log, line)
+        size = os.fstat(log).st_size
+    finally:
+        os.close(log)
+    if size > settings.FOLLOW_GRAPH_LOG_SIZE:
+        restart_log()
+
+
+def restart_log():
+    """Начинает журнал заново: все процессы перечитают граф из базы."""
+    path = settings.FOLLOW_GRAPH_LOG
+    temp_path = f'{path}.tmp{os.getpid()}'
+    open(temp_path, 'wb').close()
+    os.replace(temp_path, path)
+
+
+def changed(user_id, author_id, followed):
+    """Подписка или отписка: версия растёт сразу, журнал — после коммита."""
+    transaction.on_commit(
+        partial(append, bump(), user_id, author_id, followed))
+
+
+def invalidate():
+    """Подписки менялись в обход сигналов: все процессы перечитают граф."""
+    restart_log()
@@ -0,0 +1,297 @@
+import json
+import os
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+
+from . import caching, counters, media, search, threads, timeline
+from .models import Comment, Group, ImportedId, Post
+from .utils import chunked
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+CHUNK_SIZE = 5000
+
+
+class Lookup:
+    """Карта «имя -> pk», которая дочитывает из базы только новые имена.
+
+    Незнакомые базе имена создаются через ``create(name)`` одним
+    ``bulk_create`` на порцию.
+    """
+
+    def __init__(self, model, field, create):
+        self.model = model
+        self.field = field
+        self.create = create
+        self.known = {}
+
+    def fetch(self, names):
+        self.known.update(self.model.objects.filter(
+            **{f'{self.field}__in': names}).values_list(self.field, 'pk'))
+
+    def resolve(self, names):
+        missing = {name for name in names if name} - self.known.keys()
+        if missing:
+            self.fetch(missing)
+            missing -= self.known.keys()
+        if missing:
+            self.model.objects.bulk_create(
+                [self.create(name) for name in missing],
+                ignore_conflicts=True)
+            self.fetch(missing)
+        return self.known
+
+
+class ConcurrentInsert(RuntimeError):
+    """В таблицу писали во время вставки порции: id не сопоставить."""
+
+
+def mapped(kind, source_ids):
+    """Карта «id в выгрузке -> id в базе» для уже загруженных записей."""
+    return dict(ImportedId.objects.filter(
+        kind=kind, source_id__in=source_ids,
+    ).values_list('source_id', 'local_id'))
+
+
+def new_author(username):
+    # Пароль непригоден для входа: автор восстановит его через почту
+    return User(username=username, password=make_password(None))
+
+
+def new_group(slug):
+    return Group(title=slug, slug=slug, description='')
+
+
+@contextmanager
+def raw_dates(*fields):
+    """Отключает auto_now/auto_now_add, чтобы сохранить даты из выгрузки."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field, _, _ in saved:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    """Загрузка постов или комментариев из NDJSON.
+
+    Строки читаются потоком, порции по ``chunk_size`` строк пишутся
+    ``bulk_create`` пачками по ``batch_size`` в своей транзакции, после
+    коммита смещение в файле сохраняется в ``<файл>.checkpoint``.
+    Сигналы моделей не вызываются; производные данные (счётчики,
+    ленты, ссылки на картинки, пути комментариев) пересобирает
+    ``rebuild``, поисковый индекс дополняется в той же транзакции.
+
+    Записи получают новые id базы, а не id выгрузки, которые могут
+    совпасть с чужими строками. Соответствие хранится в ``ImportedId``
+    в той же транзакции, поэтому повтор порции после сбоя между
+    коммитом и записью контрольной точки ничего не дублирует.
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.authors = Lookup(User, 'username', new_author)
+        self.groups = Lookup(Group, 'slug', new_group)
+        self.author_ids = set()
+        self.group_ids = set()
+        self.created = 0
+        self.skipped = 0
+
+    @property
+    def checkpoint_path(self):
+        return f'{self.path}.checkpoint'
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as file:
+                return json.load(file)['offset']
+        except FileNotFoundError:
+            return 0
+
+    def save_checkpoint(self, offset):
+        temp_path = f'{self.checkpoint_path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump({'offset': offset}, file)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def lines(self, offset):
+        with open(self.path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                offset += len(line)
+                yield offset, line
+
+    def run(self, restart=False):
+        offset = 0 if restart else self.load_checkpoint()
+        dates = [self.model._meta.get_field(name)
+                 for name in self.date_fields]
+        with raw_dates(*dates):
+            for chunk in chunked(self.lines(offset), self.chunk_size):
+                records = [json.loads(line) for _, line in chunk
+                           if line.strip()]
+                with transaction.atomic():
+                    self.write(records)
+                self.save_checkpoint(chunk[-1][0])
+        self.clear_checkpoint()
+
+    def write(self, records):
+        known = mapped(self.kind, [record['id'] for record in records])
+        fresh = [record for record in records if record['id'] not in known]
+        pairs = self.build(fresh)
+        self.skipped += len(records) - len(pairs)
+        if not pairs:
+            return
+        local_ids = self.insert([obj for _, obj in pairs])
+        ImportedId.objects.bulk_create(
+            [ImportedId(kind=self.kind, source_id=source_id,
+                        local_id=local_id)
+             for (source_id, _), local_id in zip(pairs, local_ids)],
+            batch_size=self.batch_size,
+        )
+        self.created += len(pairs)
+
+    def insert(self, objects):
+        """Вставляет объекты и возвращает их id в порядке списка.
+
+        SQLite в Django 2.2 не возвращает id из ``bulk_create``, но
+        AUTOINCREMENT выдаёт их по возрастанию после прежнего максимума:
+        новые строки — это ровно строки с большим id.
+        """
+        table = self.model._meta.db_table
+        last = self.model.objects.aggregate(last=Max('pk'))['last'] or 0
+        with search.triggers_paused(table):
+            self.model.objects.bulk_create(
+                objects, batch_size=self.batch_size)
+            ids = list(self.model.objects.filter(pk__gt=last).order_by(
+                'pk').values_list('pk', flat=True))
+            if len(ids) != len(objects):
+                raise ConcurrentInsert(
+                    f'{table}: вставлено {len(objects)} строк, а после '
+                    f'id {last} их {len(ids)}')
+            search.index_range(table, ids[0], ids[-1])
+        for obj, pk in zip(objects, ids):
+            obj.pk = pk
+        return ids
+
+
+class PostImporter(Importer):
+    """Посты: ``{"id", "author", "group", "text", "pub_date", "image"}``.
+
+    ``author`` — username, ``group`` — slug или null.
+    """
+
+    kind = 'posts'
+    model = Post
+    date_fields = ('pub_date',)
+
+    def build(self, records):
+        authors = self.authors.resolve(record['author'] for record in records)
+        groups = self.groups.resolve(
+            record.get('group') for record in records)
+        pub_date = Post._meta.get_field('pub_date')
+        pairs = [
+            (record['id'], Post(
+                author_id=authors[record['author']],
+                group_id=groups.get(record.get('group')),
+                text=record['text'],
+                pub_date=pub_date.to_python(record['pub_date']),
+                image=record.get('image') or '',
+            ))
+            for record in records
+        ]
+        self.author_ids.update(post.author_id for _, post in pairs)
+        self.group_ids.update(post.group_id for _, post in pairs
+                              if post.group_id is not None)
+        return pairs
+
+
+class CommentImporter(Importer):
+    """Комментарии: ``{"id", "post", "author", "text", "created"}``.
+
+    ``post`` — id поста из загруженной ранее выгрузки постов; комментарии
+    к незагруженным постам пропускаются. Необязательны ``updated``,
+    ``active`` и ``parent`` — id комментария из этой же выгрузки, на
+    который это ответ; он должен стоять в файле раньше ответа, иначе
+    комментарий загрузится без родителя.
+    """
+
+    kind = 'comments'
+    model = Comment
+    date_fields = ('created', 'updated')
+
+    def build(self, records):
+        authors = self.authors.resolve(record['author'] for record in records)
+        posts = mapped('posts', {record['post'] for record in records})
+        post_authors = dict(Post.objects.filter(
+            pk__in=posts.values()).values_list('pk', 'author_id'))
+        parents = mapped('comments', {
+            record['parent'] for record in records if record.get('parent')})
+        created = Comment._meta.get_field('created')
+        self.pending_parents = []
+        pairs = []
+        for record in records:
+            post_id = posts.get(record['post'])
+            if post_id is None:
+                continue
+            date = created.to_python(record['created'])
+            comment = Comment(
+                post_id=post_id,
+                author_id=authors[record['author']],
+                text=record['text'],
+                created=date,
+                updated=created.to_python(record.get('updated')) or date,
+                active=record.get('active', True),
+                parent_id=parents.get(record.get('parent')),
+            )
+            if record.get('parent') and comment.parent_id is None:
+                # Родитель в этой же порции: id появится после вставки
+                self.pending_parents.append((comment, record['parent']))
+            pairs.append((record['id'], comment))
+            self.author_ids.add(post_authors[post_id])
+        return pairs
+
+    def write(self, records):
+        super().write(records)
+        if not self.pending_parents:
+            return
+        parents = mapped(
+            'comments', {parent for _, parent in self.pending_parents})
+        for comment, parent in self.pending_parents:
+            comment.parent_id = parents.get(parent)
+        Comment.objects.bulk_update(
+            [comment for comment, _ in self.pending_parents
+             if comment.parent_id is not None],
+            ['parent'], batch_size=self.batch_size)
+
+
+IMPORTERS = {
+    'posts': PostImporter,
+    'comments': CommentImporter,
+}
+
+
+def rebuild(author_ids=(), group_ids=()):
+    """Один проход по производным данным после массовой загрузки."""
+    counters.reconcile()
+    timeline.rebuild()
+    media.reconcile()
+    threads.fill_paths()
+    caching.bump(
+        caching.GLOBAL,
+        *map(caching.author_scope, author_ids),
+        *map(caching.group_scope, group_ids),
+    )
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «кого почитать» по графу подписок '
+            'для всех пользователей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int, default=settings.SUGGESTIONS_SIZE,
+            help='Сколько авторов хранить на пользователя')
+        parser.add_argument(
+            '--batch-size', type=int, default=suggestions.BATCH_SIZE,
+            help='Пользователей в одной транзакции')
+
+    def handle(self, *args, **options):
+        written = suggestions.build(options['size'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендаций записано: {written}'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты, комментарии, подписки или группы '
+            'в NDJSON или CSV')
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(export.MODELS))
+        parser.add_argument(
+            '--format', dest='output_format', choices=sorted(export.FORMATS),
+            default='ndjson')
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжимать выгрузку gzip')
+        parser.add_argument(
+            '--output', help='Файл выгрузки; без него — стандартный вывод')
+        parser.add_argument(
+            '--batch-size', type=int, default=export.BATCH_SIZE,
+            help='Сколько строк читать одним запросом')
+
+    def handle(self, *args, **options):
+        if options['gzip'] and not options['output']:
+            raise CommandError('Для --gzip нужен --output')
+        chunks = export.export(
+            options['name'], options['output_format'], options['gzip'],
+            options['batch_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
+            return
+        with open(options['output'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
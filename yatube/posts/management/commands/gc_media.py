@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from posts import media
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов, на которые не ссылается ни один пост, '
+            'вместе с их миниатюрами и вариантами')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе стольких секунд')
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Потоков обхода каталога загрузок')
+        parser.add_argument(
+            '--batch-size', type=int, default=media.BATCH_SIZE,
+            help='Сколько имён проверять по таблице постов за запрос')
+        parser.add_argument(
+            '--reconcile', action='store_true',
+            help='Сначала пересчитать ссылки по таблице постов')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            media.reconcile(options['batch_size'])
+        removed = media.collect_garbage(
+            options['min_age'], max(options['workers'], 1),
+            dry_run=options['dry_run'], batch_size=options['batch_size'])
+        for name in removed:
+            self.stdout.write(name)
+        verb = 'К удалению' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} файлов: {len(removed)}'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = ('Массово загружает посты или комментарии из NDJSON, затем '
+            'пересчитывает счётчики и ленты')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(importer.IMPORTERS))
+        parser.add_argument('path', help='Файл NDJSON')
+        parser.add_argument(
+            '--batch-size', type=int, default=importer.BATCH_SIZE,
+            help='Строк в одном INSERT')
+        parser.add_argument(
+            '--chunk-size', type=int, default=importer.CHUNK_SIZE,
+            help='Строк в одной транзакции между контрольными точками')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с начала файла, не глядя на контрольную точку')
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать производные данные (например, если '
+                 'следом загружаются комментарии)')
+
+    def handle(self, *args, **options):
+        loader = importer.IMPORTERS[options['kind']](
+            options['path'], options['batch_size'], options['chunk_size'])
+        try:
+            loader.run(restart=options['restart'])
+        except importer.ConcurrentInsert as error:
+            raise CommandError(
+                f'{error}. Порция откачена, повторите загрузку, когда '
+                f'в таблицу никто не пишет')
+        self.stdout.write(
+            f'Загружено: {loader.created}, пропущено: {loader.skipped}')
+        if not options['no_rebuild']:
+            importer.rebuild(loader.author_ids, loader.group_ids)
+            self.stdout.write('Производные данные пересчитаны')
+        self.stdout.write(self.style.SUCCESS('Готово'))
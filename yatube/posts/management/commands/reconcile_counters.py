@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=counters.BATCH_SIZE,
+            help='Сколько строк пересчитывать в одной транзакции')
+
+    def handle(self, *args, **options):
+        counters.reconcile(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,198 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts import counters, graph, threads, timeline
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import chunked
+
+User = get_user_model()
+
+TEXT_POOL_SIZE = 1000
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса рангов 1..size с вероятностью ~ 1 / rank^s."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, size + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, постами, '
+            'подписками и комментариями для нагрузочных замеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--comments-per-post', type=int, default=2)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа для авторов и подписок')
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Сколько строк вставлять в одной транзакции')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересчитывать счётчики, ленты и пути комментариев '
+                 'после вставки')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        fake = Faker('ru_RU')
+        fake.seed_instance(options['seed'])
+        self.texts = [fake.paragraph() for _ in range(TEXT_POOL_SIZE)]
+        self.now = timezone.now()
+
+        user_ids = self.create_users(options['users'])
+        if not user_ids:
+            return
+        group_ids = self.create_groups(options['groups'])
+        ranks = zipf_weights(len(user_ids), options['zipf'])
+        self.create_follows(
+            user_ids, ranks, options['follows_per_user'])
+        graph.invalidate()
+        first_post = self.create_posts(
+            user_ids, ranks, group_ids, options['posts'])
+        self.create_comments(
+            user_ids, first_post, options['comments_per_post'])
+        if not options['skip_rebuild']:
+            self.stdout.write('Пересчёт счётчиков и лент...')
+            counters.reconcile()
+            timeline.rebuild()
+            threads.fill_paths()
+        self.stdout.write(self.style.SUCCESS('База заполнена'))
+
+    def insert(self, model, columns, rows):
+        """Вставляет кортежи ``rows`` пачками, каждая в своей транзакции.
+
+        Строки идут в ``executemany`` без создания моделей: на таких
+        объёмах bulk_create почти всё время собирает SQL по объектам.
+        Сигналы не срабатывают, счётчики и ленты пересчитываются в конце.
+        """
+        meta = model._meta
+        fields = [meta.get_field(name) for name in columns]
+        quote = connection.ops.quote_name
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(meta.db_table),
+            ', '.join(quote(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        dates = [index for index, field in enumerate(fields)
+                 if field.get_internal_type() == 'DateTimeField']
+        adapt = connection.ops.adapt_datetimefield_value
+        total = 0
+        for chunk in chunked(rows, self.chunk_size):
+            if dates:
+                chunk = [list(row) for row in chunk]
+                for row in chunk:
+                    for index in dates:
+                        row[index] = adapt(row[index])
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, chunk)
+            total += len(chunk)
+        self.stdout.write(f'{meta.verbose_name_plural}: {total}')
+
+    def create_users(self, count):
+        prefix = f'seed{self.random.getrandbits(32):08x}'
+        columns = ('username', 'password', 'first_name', 'last_name',
+                   'email', 'is_superuser', 'is_staff', 'is_active',
+                   'date_joined')
+        self.insert(User, columns, (
+            (f'{prefix}_{number}', '!', f'Автор {number}', '', '',
+             False, False, True, self.now)
+            for number in range(count)
+        ))
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_groups(self, count):
+        prefix = f'seed{self.random.getrandbits(32):08x}'
+        self.insert(Group, ('title', 'slug', 'description'), (
+            (f'Группа {number}', f'{prefix}-{number}',
+             self.random.choice(self.texts))
+            for number in range(count)
+        ))
+        return list(Group.objects.filter(
+            slug__startswith=f'{prefix}-').values_list('pk', flat=True))
+
+    def create_follows(self, user_ids, ranks, per_user):
+        per_user = min(per_user, len(user_ids) - 1)
+
+        def follows():
+            for user_id in user_ids:
+                authors = set()
+                while len(authors) < per_user:
+                    author_id, = self.random.choices(
+                        user_ids, cum_weights=ranks)
+                    if author_id != user_id:
+                        authors.add(author_id)
+                for author_id in authors:
+                    yield user_id, author_id
+
+        self.insert(Follow, ('user', 'author'), follows())
+
+    def create_posts(self, user_ids, ranks, group_ids, count):
+        last = Post.objects.order_by('-pk').values_list('pk', flat=True)
+        first_post = (last.first() or 0) + 1
+        groups = group_ids + [None] * len(group_ids)
+        step = timedelta(days=365) / max(count, 1)
+
+        def posts():
+            for number in range(count):
+                yield (
+                    self.random.choice(self.texts),
+                    self.now - step * (count - number),
+                    self.random.choices(user_ids, cum_weights=ranks)[0],
+                    self.random.choice(groups) if groups else None,
+                    '',
+                    0,
+                )
+
+        columns = ('text', 'pub_date', 'author', 'group', 'image',
+                   'comment_count')
+        self.insert(Post, columns, posts())
+        return first_post
+
+    def create_comments(self, user_ids, first_post, per_post):
+        if not per_post:
+            return
+        posts = Post.objects.order_by('pk').values_list('pk', 'pub_date')
+
+        def comments():
+            last = first_post - 1
+            while True:
+                # Посты читаются порциями по ключу, а не одним курсором,
+                # чтобы чтение не пересекалось с пакетными транзакциями.
+                chunk = list(posts.filter(pk__gt=last)[:self.chunk_size])
+                if not chunk:
+                    return
+                last = chunk[-1][0]
+                for post_id, pub_date in chunk:
+                    for number in range(per_post):
+                        created = pub_date + timedelta(minutes=number + 1)
+                        yield (
+                            post_id,
+                            self.random.choice(user_ids),
+                            self.random.choice(self.texts),
+                            created,
+                            created,
+                            True,
+                            '',
+                            0,
+                        )
+
+        # Пути веток проставляет threads.fill_paths после вставки
+        columns = ('post', 'author', 'text', 'created', 'updated', 'active',
+                   'path', 'depth')
+        self.insert(Comment, columns, comments())
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Нарезает недостающие миниатюры и адаптивные варианты '
+            'для всех картинок постов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS,
+            help='Потоков нарезки; 0 — резать в текущем потоке')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').order_by('pk').values_list(
+            'pk', 'image')
+        total, last = 0, 0
+        with ExitStack() as stack:
+            run = map
+            if options['workers']:
+                run = stack.enter_context(
+                    ThreadPoolExecutor(max_workers=options['workers'])).map
+            while True:
+                # Порции по ключу, а не открытый курсор: потоки пишут
+                # в базу, пока читается следующая порция.
+                chunk = list(posts.filter(pk__gt=last)[:options['chunk_size']])
+                if not chunk:
+                    break
+                last = chunk[-1][0]
+                list(run(thumbnails.process, *zip(*chunk)))
+                total += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Картинок обработано: {total}'))
@@ -0,0 +1,142 @@
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from sorl.thumbnail import default as sorl_default
+
+from . import thumbnails, variants
+from .counters import _change, count_of
+from .models import MediaBlob, Post
+from .storage import UPLOAD_PREFIX
+from .utils import chunked
+
+BATCH_SIZE = 1000
+
+
+def change(name, delta):
+    """Сдвигает счётчик ссылок на файл, создавая строку при нужде."""
+    blobs = MediaBlob.objects.filter(name=name)
+    if not _change(blobs, 'ref_count', delta) and delta > 0:
+        MediaBlob.objects.get_or_create(name=name)
+        _change(blobs, 'ref_count', delta)
+
+
+def _names(queryset, batch_size):
+    last = ''
+    while True:
+        names = list(queryset.filter(name__gt=last).order_by('name')
+                     .values_list('name', flat=True)[:batch_size])
+        if not names:
+            return
+        last = names[-1]
+        yield names
+
+
+def reconcile(batch_size=BATCH_SIZE):
+    """Пересчитывает ссылки по таблице постов порциями по имени файла."""
+    for names in chunked(
+            Post.objects.exclude(image='').order_by('image')
+            .values_list('image', flat=True).distinct().iterator(),
+            batch_size):
+        MediaBlob.objects.bulk_create(
+            [MediaBlob(name=name) for name in names], ignore_conflicts=True)
+    for names in _names(MediaBlob.objects.all(), batch_size):
+        with transaction.atomic():
+            MediaBlob.objects.filter(name__in=names).update(
+                ref_count=count_of(Post, 'image', 'name'))
+
+
+def unreferenced(names):
+    referenced = set(Post.objects.filter(
+        image__in=names).values_list('image', flat=True))
+    return [name for name in names if name not in referenced]
+
+
+def purge(name):
+    """Удаляет файл, его миниатюры sorl, адаптивные варианты и строку."""
+    sorl_default.kvstore.delete(thumbnails.source_file(name))
+    shutil.rmtree(
+        default_storage.path(variants.variant_dir(name)), ignore_errors=True)
+    variants.image_storage().delete(name)
+    MediaBlob.objects.filter(name=name).delete()
+
+
+def _scan(path):
+    found = []
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    found.append((entry.path, entry.stat().st_mtime))
+    return found
+
+
+def walk(root, workers):
+    """Пары (путь, mtime) всех файлов под ``root``.
+
+    Подкаталоги первого уровня (шарды ``ab/``) обходятся параллельно
+    в пуле потоков.
+    """
+    if not os.path.isdir(root):
+        return
+    subdirs = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry.path, entry.stat().st_mtime
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for found in pool.map(_scan, subdirs):
+            yield from found
+
+
+def collect_garbage(min_age, workers, dry_run=False, batch_size=BATCH_SIZE):
+    """Удаляет файлы картинок, на которые не ссылается ни один пост.
+
+    Кандидаты — строки ``MediaBlob`` с нулём ссылок и файлы каталога
+    загрузок, найденные обходом диска (их могли оставить массовые
+    вставки в обход сигналов). Перед удалением ссылки проверяются по
+    таблице постов; файлы моложе ``min_age`` секунд не трогаются, чтобы
+    не удалить картинку поста, который ещё сохраняется.
+    """
+    files = variants.image_storage()
+    deadline = time.time() - min_age
+    removed = []
+
+    def sweep(names):
+        for name in unreferenced(names):
+            path = files.path(name)
+            if os.path.exists(path) and os.path.getmtime(path) > deadline:
+                continue
+            removed.append(name)
+            if not dry_run:
+                purge(name)
+
+    for names in _names(MediaBlob.objects.filter(ref_count=0), batch_size):
+        sweep(names)
+    upload_to = Post._meta.get_field('image').upload_to
+    candidates = (
+        (path, mtime)
+        for path, mtime in walk(files.path(upload_to), workers)
+        if mtime <= deadline
+    )
+    for chunk in chunked(candidates, batch_size):
+        names = []
+        for path, _ in chunk:
+            if os.path.basename(path).startswith(UPLOAD_PREFIX):
+                # Временный файл прерванной загрузки
+                removed.append(path)
+                if not dry_run:
+                    os.remove(path)
+                continue
+            names.append(os.path.relpath(path, files.location).replace(
+                os.sep, '/'))
+        sweep(names)
+    return removed
@@ -0,0 +1,71 @@
+from django.db import migrations
+
+INDEXES = {
+    'posts_post_fts': 'posts_post',
+    'posts_comment_fts': 'posts_comment',
+}
+
+CREATE = '''
+CREATE VIRTUAL TABLE {index} USING fts5(
+    text,
+    content='{table}',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+)
+'''
+TRIGGERS = (
+    '''
+    CREATE TRIGGER {index}_insert AFTER INSERT ON {table}
+    BEGIN
+        INSERT INTO {index}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER {index}_delete AFTER DELETE ON {table}
+    BEGIN
+        INSERT INTO {index}({index}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER {index}_update AFTER UPDATE OF text ON {table}
+    BEGIN
+        INSERT INTO {index}({index}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {index}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for index, table in INDEXES.items():
+        schema_editor.execute(CREATE.format(index=index, table=table))
+        for trigger in TRIGGERS:
+            schema_editor.execute(trigger.format(index=index, table=table))
+        schema_editor.execute(
+            f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for index in INDEXES:
+        for action in ('insert', 'delete', 'update'):
+            schema_editor.execute(
+                f'DROP TRIGGER IF EXISTS {index}_{action}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
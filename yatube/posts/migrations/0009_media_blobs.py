@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:00
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def fill_media_blobs(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MediaBlob = apps.get_model('posts', 'MediaBlob')
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=row['image'], ref_count=row['total'])
+         for row in Post.objects.exclude(image='').order_by()
+         .values('image').annotate(total=Count('pk')).iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(fill_media_blobs, migrations.RunPython.noop),
+    ]
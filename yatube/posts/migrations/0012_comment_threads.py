@@ -0,0 +1,54 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия posts.threads на момент миграции: до неё все комментарии — корни
+SEGMENT = 10
+ROOT_BASE = 10 ** SEGMENT - 1
+
+
+def fill_root_paths(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    batch = []
+    for pk in Comment.objects.order_by('pk').values_list(
+            'pk', flat=True).iterator():
+        batch.append(Comment(pk=pk, path=f'{ROOT_BASE - pk:0{SEGMENT}d}'))
+        if len(batch) == 1000:
+            Comment.objects.bulk_update(batch, ['path'])
+            batch = []
+    Comment.objects.bulk_update(batch, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_comment_post_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_root_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'depth', 'path'], name='comment_post_depth_path_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:22
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def count_of(Follow, field):
+    counted = (
+        Follow.objects.filter(**{field: OuterRef('user_id')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Оставляет у каждой пары (user, author) самую раннюю подписку.
+
+    Дубли удаляются порциями по первичному ключу, затем у затронутых
+    пользователей пересчитываются счётчики подписок.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorCounters = apps.get_model('posts', 'AuthorCounters')
+    earlier = Follow.objects.filter(
+        user_id=OuterRef('user_id'),
+        author_id=OuterRef('author_id'),
+        pk__lt=OuterRef('pk'),
+    )
+    duplicates = Follow.objects.annotate(
+        twin=Exists(earlier)).filter(twin=True).order_by('pk')
+    affected = set()
+    last = 0
+    while True:
+        batch = list(duplicates.filter(pk__gt=last).values_list(
+            'pk', 'user_id', 'author_id')[:BATCH_SIZE])
+        if not batch:
+            break
+        last = batch[-1][0]
+        Follow.objects.filter(pk__in=[pk for pk, _, _ in batch]).delete()
+        for _, user_id, author_id in batch:
+            affected.update((user_id, author_id))
+    affected = sorted(affected)
+    for start in range(0, len(affected), BATCH_SIZE):
+        AuthorCounters.objects.filter(
+            user_id__in=affected[start:start + BATCH_SIZE],
+        ).update(
+            follower_count=count_of(Follow, 'author'),
+            following_count=count_of(Follow, 'user'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_suggestions'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'user'], name='follow_author_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
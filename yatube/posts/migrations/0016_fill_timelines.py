@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.db import migrations, transaction
+from django.db.models import Count
+
+# Копия posts.timeline.rebuild на момент миграции: ленты подписок,
+# созданные в 0005, заполняются последними постами авторов
+BATCH_SIZE = 1000
+REBUILD_SQL = '''
+    INSERT INTO {entries} (user_id, post_id, author_id, pub_date)
+    SELECT follow.user_id, post.id, post.author_id, post.pub_date
+    FROM {follows} AS follow
+    JOIN {posts} AS post ON post.id IN (
+        SELECT latest.id FROM {posts} AS latest
+        WHERE latest.author_id = follow.author_id
+        ORDER BY latest.pub_date DESC, latest.id DESC
+        LIMIT %s
+    )
+    WHERE follow.id > %s AND follow.id <= %s
+'''
+
+
+def fill_timelines(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    sql = REBUILD_SQL.format(
+        entries=quote(TimelineEntry._meta.db_table),
+        follows=quote(Follow._meta.db_table),
+        posts=quote(Post._meta.db_table),
+    )
+    excluded = list(
+        Follow.objects.values('author_id')
+        .annotate(total=Count('pk'))
+        .filter(total__gte=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list('author_id', flat=True)
+    )
+    if excluded:
+        sql += ' AND follow.author_id NOT IN ({})'.format(
+            ', '.join(['%s'] * len(excluded)))
+    TimelineEntry.objects.all().delete()
+    follows = Follow.objects.order_by('pk').values_list('pk', flat=True)
+    last = 0
+    while True:
+        batch = list(follows.filter(pk__gt=last)[:BATCH_SIZE])
+        if not batch:
+            return
+        params = [settings.TIMELINE_BACKFILL_SIZE, last, batch[-1]]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, params + excluded)
+        last = batch[-1]
+
+
+class Migration(migrations.Migration):
+    # Каждая порция подписок — своя транзакция: одна на всю миграцию
+    # держала бы журнал базы до конца заполнения
+    atomic = False
+
+    dependencies = [
+        ('posts', '0015_post_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
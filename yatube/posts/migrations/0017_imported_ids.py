@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_fill_timelines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedId',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16, verbose_name='Вид записей')),
+                ('source_id', models.BigIntegerField(verbose_name='Id в выгрузке')),
+                ('local_id', models.BigIntegerField(verbose_name='Id в базе')),
+            ],
+            options={
+                'verbose_name': 'Импортированная запись',
+                'verbose_name_plural': 'Импортированные записи',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='importedid',
+            constraint=models.UniqueConstraint(fields=('kind', 'source_id'), name='unique_imported_id'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_imported_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Версия подписок',
+                'verbose_name_plural': 'Версии подписок',
+            },
+        ),
+    ]
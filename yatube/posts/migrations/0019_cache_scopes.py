@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_follow_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheScope',
+            fields=[
+                ('scope', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Область')),
+                ('generation', models.BigIntegerField(verbose_name='Поколение')),
+                ('modified', models.FloatField(verbose_name='Время изменения (unix time)')),
+            ],
+            options={
+                'verbose_name': 'Область кеша',
+                'verbose_name_plural': 'Области кеша',
+            },
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import post_images
+
 User = get_user_model()
 
 
@@ -29,11 +31,23 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_images,
         blank=True
     )
+    comment_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False)
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.text[:15]}"
@@ -55,11 +69,34 @@ class Comment(models.Model):
         auto_now=True)
     active = models.BooleanField(
         default=True)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        blank=True,
+        null=True,
+        verbose_name='Ответ на')
+    # Материализованный путь от корня ветки, см. posts.threads
+    path = models.CharField(
+        max_length=255,
+        default='',
+        editable=False)
+    depth = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False)
 
     class Meta:
         ordering = ['-created']
         verbose_name_plural = 'Коментарии'
         verbose_name = 'Коментарий'
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+            models.Index(fields=['post', 'path'],
+                         name='comment_post_path_idx'),
+            models.Index(fields=['post', 'depth', 'path'],
+                         name='comment_post_depth_path_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -80,6 +117,219 @@ class Follow(models.Model):
     class Meta:
         verbose_name_plural = 'Подписки'
         verbose_name = 'Подписка'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user} подписался на {self.author}'
+
+
+class FollowVersion(models.Model):
+    """Номер версии подписок, одна строка.
+
+    Растёт на единицу в транзакции с каждой подпиской и отпиской: запись
+    в базе сериализована, поэтому номер не теряет правок параллельных
+    воркеров. После коммита правка с её номером дописывается в журнал
+    ``FOLLOW_GRAPH_LOG``, и процессы догоняют по нему свой граф подписок
+    (``posts.graph``) без запросов к базе.
+    """
+    version = models.BigIntegerField('Версия', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Версии подписок'
+        verbose_name = 'Версия подписок'
+
+    def __str__(self):
+        return f'Подписки, версия {self.version}'
+
+
+class CacheScope(models.Model):
+    """Поколение и время изменения области кеша (``posts.caching``).
+
+    Общая для всех воркеров: ``bump`` — один атомарный UPDATE в
+    транзакции правки, и до коммита другие видят старое поколение.
+    """
+    scope = models.CharField('Область', max_length=64, primary_key=True)
+    generation = models.BigIntegerField('Поколение')
+    modified = models.FloatField('Время изменения (unix time)')
+
+    class Meta:
+        verbose_name_plural = 'Области кеша'
+        verbose_name = 'Область кеша'
+
+    def __str__(self):
+        return f'{self.scope}: {self.generation}'
+
+
+class AuthorCounters(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются сигналами через F-выражения; расхождения исправляет
+    команда ``reconcile_counters``.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters')
+    post_count = models.PositiveIntegerField('Постов', default=0)
+    follower_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Счётчики пользователей'
+        verbose_name = 'Счётчики пользователя'
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Заполняется при публикации поста (fan-out on write), поэтому лента
+    читается одним диапазоном по индексу ``(user, pub_date, post)``.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post_id']
+        verbose_name_plural = 'Ленты подписок'
+        verbose_name = 'Запись ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_post'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'),
+            models.Index(
+                fields=['user', 'author'], name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
+
+
+class Suggestion(models.Model):
+    """Автор, которого стоит предложить пользователю.
+
+    Таблицу целиком пересчитывает команда ``build_suggestions``, блок
+    на странице подписок читает её одним запросом по ``(user, rank)``.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+')
+    score = models.FloatField('Очки')
+    rank = models.PositiveSmallIntegerField('Место')
+
+    class Meta:
+        ordering = ['user', 'rank']
+        verbose_name_plural = 'Рекомендации авторов'
+        verbose_name = 'Рекомендация автора'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_suggestion'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'rank'], name='suggestion_user_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.author} для {self.user}'
+
+
+class MediaBlob(models.Model):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются.
+
+    Одинаковые загрузки хранятся одним файлом; файл с нулём ссылок
+    удаляет команда ``gc_media``.
+    """
+    name = models.CharField('Файл', max_length=100, primary_key=True)
+    ref_count = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Файлы картинок'
+        verbose_name = 'Файл картинки'
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count})'
+
+
+class ImageVariant(models.Model):
+    """Адаптивный вариант картинки поста: одна ширина в одном формате.
+
+    Варианты режутся в фоне после загрузки картинки; ``source`` — имя
+    файла, из которого нарезан вариант, чтобы не показывать варианты
+    старой картинки после редактирования поста.
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants')
+    source = models.CharField('Исходный файл', max_length=100)
+    format = models.CharField('Формат', max_length=10)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    name = models.CharField('Файл', max_length=255)
+
+    class Meta:
+        ordering = ['post', 'format', 'width']
+        verbose_name_plural = 'Варианты картинок'
+        verbose_name = 'Вариант картинки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'format', 'width'],
+                name='unique_image_variant'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.format}, {self.width}px)'
+
+
+class ImportedId(models.Model):
+    """Id записи из выгрузки и id, под которым она сохранена в базе.
+
+    Импорт не переносит id выгрузки в базу: по этой карте он пропускает
+    уже загруженные записи при повторе порции и находит посты и
+    родительские комментарии для загружаемых комментариев.
+    """
+    kind = models.CharField('Вид записей', max_length=16)
+    source_id = models.BigIntegerField('Id в выгрузке')
+    local_id = models.BigIntegerField('Id в базе')
+
+    class Meta:
+        verbose_name_plural = 'Импортированные записи'
+        verbose_name = 'Импортированная запись'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'source_id'], name='unique_imported_id'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.source_id} -> {self.local_id}'
@@ -0,0 +1,243 @@
+import base64
+import json
+import re
+from contextlib import contextmanager
+
+from django.db import connection, connections
+from django.db.transaction import TransactionManagementError
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .utils import RawSubquery
+
+POST_INDEX = 'posts_post_fts'
+COMMENT_INDEX = 'posts_comment_fts'
+# Индекс FTS5 -> таблица с текстом (external content)
+INDEXES = {
+    POST_INDEX: 'posts_post',
+    COMMENT_INDEX: 'posts_comment',
+}
+INDEX_FOR = {table: index for index, table in INDEXES.items()}
+MAX_TERMS = 8
+# bm25 отрицателен, меньше — лучше: совпадение только в комментарии
+# получает вдвое более слабый вес, чем совпадение в тексте поста.
+COMMENT_WEIGHT = 0.5
+SNIPPET_TOKENS = 24
+# Служебные символы вместо <mark>: текст экранируется уже после snippet()
+MARK_START, MARK_END = '\x02', '\x03'
+
+TRIGGERS = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table}
+    BEGIN
+        INSERT INTO {index}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table}
+    BEGIN
+        INSERT INTO {index}({index}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS {index}_update
+    AFTER UPDATE OF text ON {table}
+    BEGIN
+        INSERT INTO {index}({index}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {index}(rowid, text) VALUES (new.id, new.text);
+    END
+    ''',
+)
+
+HITS = '''
+SELECT post_id, MIN(score) AS score FROM (
+    SELECT rowid AS post_id, bm25(posts_post_fts) AS score
+    FROM posts_post_fts
+    WHERE posts_post_fts MATCH %s
+    UNION ALL
+    SELECT comment.post_id, bm25(posts_comment_fts) * %s
+    FROM posts_comment_fts
+    JOIN posts_comment AS comment ON comment.id = posts_comment_fts.rowid
+    WHERE posts_comment_fts MATCH %s AND comment.active
+)
+GROUP BY post_id
+{after}
+ORDER BY score, post_id
+LIMIT %s
+'''
+AFTER = 'HAVING score > %s OR (score = %s AND post_id > %s)'
+
+POST_SNIPPETS = '''
+SELECT rowid, snippet(posts_post_fts, 0, %s, %s, '…', %s)
+FROM posts_post_fts
+WHERE posts_post_fts MATCH %s AND rowid IN ({ids})
+'''
+COMMENT_SNIPPETS = '''
+SELECT comment.post_id, snippet(posts_comment_fts, 0, %s, %s, '…', %s)
+FROM posts_comment_fts
+JOIN posts_comment AS comment ON comment.id = posts_comment_fts.rowid
+WHERE posts_comment_fts MATCH %s AND comment.active
+    AND comment.post_id IN ({ids})
+'''
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасный запрос FTS5.
+
+    Слова ищутся по префиксу и все сразу; операторы и кавычки FTS5
+    из ввода не проходят.
+    """
+    terms = re.findall(r'\w+', query.lower())[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def install_triggers(sender=None, using='default', **kwargs):
+    """Создаёт триггеры синхронизации индексов, если их нет.
+
+    Подключён к ``post_migrate``: SQLite пересоздаёт таблицу при
+    изменении её схемы и удаляет вместе с ней триггеры.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    tables = db.introspection.table_names()
+    with db.cursor() as cursor:
+        for index, table in INDEXES.items():
+            if index not in tables or table not in tables:
+                continue
+            for trigger in TRIGGERS:
+                cursor.execute(trigger.format(index=index, table=table))
+
+
+@contextmanager
+def triggers_paused(table):
+    """Снимает триггеры индекса ``table`` на время пакетной вставки.
+
+    Только внутри транзакции: снятие, вставка и возврат триггеров
+    коммитятся вместе. Пока транзакция держит запись, другие соединения
+    не могут вставить строку мимо индекса, а сбой откатывает и снятие.
+    Вставленные строки индексирует ``index_range``.
+    """
+    if not enabled():
+        yield
+        return
+    if not connection.in_atomic_block:
+        raise TransactionManagementError(
+            'triggers_paused() работает только внутри транзакции')
+    index = INDEX_FOR[table]
+    with connection.cursor() as cursor:
+        for event in ('insert', 'delete', 'update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {index}_{event}')
+    try:
+        yield
+    finally:
+        # После ошибки базы запросы невозможны, а откат транзакции
+        # вернёт триггеры и так
+        if not connection.needs_rollback:
+            install_triggers(using=connection.alias)
+
+
+def index_range(table, first, last):
+    """Добавляет в индекс строки ``table`` с id от ``first`` до ``last``."""
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {INDEX_FOR[table]}(rowid, text) '
+            f'SELECT id, text FROM {table} WHERE id BETWEEN %s AND %s',
+            [first, last])
+
+
+def rebuild():
+    """Перестраивает индексы целиком по текущему содержимому таблиц."""
+    with connection.cursor() as cursor:
+        for index in INDEXES:
+            cursor.execute(
+                f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def matching_ids(index, query):
+    """Подзапрос rowid совпадений для ``pk__in`` в админке."""
+    return RawSubquery(
+        f'SELECT rowid FROM {index} WHERE {index} MATCH %s',
+        (match_expression(query),))
+
+
+def encode_cursor(score, post_id):
+    raw = json.dumps([score, post_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Испорченный или пустой токен означает первую страницу."""
+    if not cursor:
+        return None
+    try:
+        score, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), int(post_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def snippets(sql, expression, ids):
+    if not ids:
+        return {}
+    sql = sql.format(ids=', '.join(['%s'] * len(ids)))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql, [MARK_START, MARK_END, SNIPPET_TOKENS, expression, *ids])
+        return {post_id: highlight(text) for post_id, text in cursor}
+
+
+def search_page(query, cursor=None, per_page=10):
+    """Страница постов по BM25 с подсвеченными фрагментами.
+
+    Пост найден, если запрос совпал с его текстом или с текстом его
+    активного комментария. Страницы листаются по ключу (score, id),
+    поэтому глубина выдачи не влияет на время ответа.
+    """
+    page = {'posts': [], 'next_cursor': None}
+    expression = match_expression(query)
+    if not expression or not enabled():
+        return page
+    params = [expression, COMMENT_WEIGHT, expression]
+    after = decode_cursor(cursor)
+    if after is not None:
+        score, post_id = after
+        params += [score, score, post_id]
+    params.append(per_page + 1)
+    with connection.cursor() as db:
+        db.execute(HITS.format(after=AFTER if after else ''), params)
+        hits = db.fetchall()
+    if len(hits) > per_page:
+        hits = hits[:per_page]
+        last_id, last_score = hits[-1]
+        page['next_cursor'] = encode_cursor(last_score, last_id)
+    ids = [post_id for post_id, _ in hits]
+    found = snippets(POST_SNIPPETS, expression, ids)
+    # Для найденных только по комментариям — фрагмент комментария
+    found.update(snippets(
+        COMMENT_SNIPPETS, expression,
+        [post_id for post_id in ids if post_id not in found]))
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    for post_id in ids:
+        post = posts.get(post_id)
+        if post is not None:
+            post.snippet = found.get(post_id, '')
+            page['posts'].append(post)
+    return page
@@ -0,0 +1,158 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (caching, counters, graph, media, threads, thumbnails,
+               timeline)
+from .models import AuthorCounters, Comment, Follow, Post
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def user_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorCounters.objects.get_or_create(user=instance)
+
+
+# Счётчики обновляются раньше лент: fan-out смотрит на follower_count.
+@receiver(post_save, sender=Post)
+def post_count_up(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_author(instance.author_id, 'post_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_count_down(sender, instance, **kwargs):
+    counters.change_author(instance.author_id, 'post_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_count_up(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments(instance.post_id, 1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_path(sender, instance, created, raw=False, **kwargs):
+    # Путь строится из id, поэтому записывается уже после INSERT
+    if created and not raw:
+        threads.assign_path(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_count_down(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_count_up(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_author(instance.author_id, 'follower_count', 1)
+        counters.change_author(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_count_down(sender, instance, **kwargs):
+    counters.change_author(instance.author_id, 'follower_count', -1)
+    counters.change_author(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_previous_state(sender, instance, raw=False, **kwargs):
+    instance._previous_image = ''
+    if raw or instance.pk is None:
+        return
+    previous = Post.objects.filter(
+        pk=instance.pk).values_list('group_id', 'image').first()
+    if previous is None:
+        return
+    old_group_id, instance._previous_image = previous
+    if old_group_id not in (None, instance.group_id):
+        caching.bump(caching.group_scope(old_group_id))
+
+
+@receiver(post_save, sender=Post)
+def post_image_refs(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_image', '')
+    current = instance.image.name or ''
+    if previous == current:
+        return
+    if current:
+        media.change(current, 1)
+    if previous:
+        media.change(previous, -1)
+    instance._previous_image = current
+
+
+@receiver(post_delete, sender=Post)
+def post_image_release(sender, instance, **kwargs):
+    if instance.image:
+        media.change(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_invalidate(sender, instance, **kwargs):
+    caching.bump(*caching.post_scopes(instance.author_id, instance.group_id))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_invalidate(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).values_list(
+        'author_id', 'group_id').first()
+    if post is not None:
+        caching.bump(*caching.post_scopes(*post))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_touch(sender, instance, **kwargs):
+    # Счётчики подписок влияют на Last-Modified страниц обоих пользователей
+    caching.touch(caching.author_scope(instance.author_id),
+                  caching.author_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_graph_add(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        graph.changed(instance.user_id, instance.author_id, True)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_graph_remove(sender, instance, **kwargs):
+    graph.changed(instance.user_id, instance.author_id, False)
+
+
+@receiver(post_save, sender=Follow)
+def follow_backfill(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_trim(sender, instance, **kwargs):
+    timeline.unfollowed(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def post_image_upload(sender, instance, raw=False, **kwargs):
+    # Файл ещё не записан в хранилище — значит, картинку только загрузили
+    instance._image_uploaded = (
+        not raw and bool(instance.image) and not instance.image._committed)
+
+
+@receiver(post_save, sender=Post)
+def post_thumbnails(sender, instance, **kwargs):
+    if getattr(instance, '_image_uploaded', False):
+        instance._image_uploaded = False
+        thumbnails.schedule(instance)
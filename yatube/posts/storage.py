@@ -0,0 +1,67 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Временные файлы загрузок лежат рядом с готовыми, чтобы os.replace
+# переносил их атомарно в пределах одной файловой системы.
+UPLOAD_PREFIX = '.upload-'
+
+
+def blob_name(directory, digest, extension):
+    """Адрес файла по содержимому: ``posts/ab/cd/abcd….jpg``."""
+    return os.path.join(
+        directory, digest[:2], digest[2:4], f'{digest}{extension}'
+    ).replace('\\', '/')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит загрузки под SHA-256 их содержимого.
+
+    Файл хешируется по кускам в один проход с записью во временный
+    файл; если такие байты уже лежат в хранилище, копия удаляется,
+    а ``save`` возвращает имя существующего файла. Каталог из
+    ``upload_to`` и расширение исходного имени сохраняются.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя всё равно вычисляется из содержимого в _save
+        return name
+
+    def _save(self, name, content):
+        directory, basename = os.path.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        hasher = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(
+            dir=self.path(directory), prefix=UPLOAD_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    temp.write(chunk)
+            name = blob_name(directory, hasher.hexdigest(), extension)
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+                # Свежее mtime защищает файл от gc_media, пока новый
+                # пост с этой картинкой ещё не сохранён
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+post_images = ContentAddressedStorage()
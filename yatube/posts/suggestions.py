@@ -0,0 +1,117 @@
+import heapq
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import graph
+from .models import Suggestion
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+# Сколько соседей вершины учитывать на каждом шаге: у популярных авторов
+# берутся первые по id, иначе одна знаменитость съест всё время расчёта
+NEIGHBOURS = 50
+# Подписка автора, на которого подписан пользователь, весит больше, чем
+# совпадение вкусов с другим читателем
+FRIEND_WEIGHT = 1.0
+CO_FOLLOW_WEIGHT = 0.5
+
+
+def scores(follows, user_id, neighbours=NEIGHBOURS):
+    """Очки кандидатов для пользователя по графу подписок.
+
+    Друг друга: авторы, на которых подписаны авторы пользователя.
+    Со-подписка: авторы, на которых подписаны другие подписчики тех же
+    авторов; вклад делится на число подписчиков — подписка на
+    популярного автора мало говорит о вкусе.
+    """
+    result = Counter()
+    for author_id in follows.following_ids(user_id)[:neighbours]:
+        for candidate in follows.following_ids(author_id)[:neighbours]:
+            result[candidate] += FRIEND_WEIGHT
+        readers = follows.follower_ids(author_id)
+        weight = CO_FOLLOW_WEIGHT / len(readers)
+        for reader_id in readers[:neighbours]:
+            if reader_id == user_id:
+                continue
+            for candidate in follows.following_ids(reader_id)[:neighbours]:
+                result[candidate] += weight
+    return result
+
+
+def popular(follows, size):
+    """Самые читаемые авторы — для тех, кому графу нечего предложить."""
+    return heapq.nlargest(size, follows.authors(), key=follows.follower_count)
+
+
+def top(follows, user_id, fallback, size):
+    """Лучшие ``size`` авторов, на которых пользователь ещё не подписан."""
+    candidates = scores(follows, user_id)
+    best = heapq.nlargest(
+        size,
+        ((score, author_id) for author_id, score in candidates.items()
+         if author_id != user_id
+         and not follows.follows(user_id, author_id)),
+        key=lambda item: (item[0], -item[1]),
+    )
+    chosen = {author_id for _, author_id in best}
+    for author_id in fallback:
+        if len(best) >= size:
+            break
+        if (author_id != user_id and author_id not in chosen
+                and not follows.follows(user_id, author_id)):
+            best.append((0.0, author_id))
+            chosen.add(author_id)
+    return best
+
+
+def user_batches(batch_size):
+    users = User.objects.order_by('pk').values_list('pk', flat=True)
+    last = 0
+    while True:
+        batch = list(users.filter(pk__gt=last)[:batch_size])
+        if not batch:
+            return
+        last = batch[-1]
+        yield batch
+
+
+def build(size=None, batch_size=BATCH_SIZE):
+    """Пересчитывает рекомендации всех пользователей порциями.
+
+    Граф читается один раз; каждая порция пользователей заменяет свои
+    строки в отдельной транзакции. Возвращает число записанных строк.
+    """
+    size = size or settings.SUGGESTIONS_SIZE
+    follows = graph.get()
+    fallback = popular(follows, size * 2)
+    written = 0
+    for batch in user_batches(batch_size):
+        rows = [
+            Suggestion(user_id=user_id, author_id=author_id,
+                       score=score, rank=rank)
+            for user_id in batch
+            for rank, (score, author_id) in enumerate(
+                top(follows, user_id, fallback, size))
+        ]
+        with transaction.atomic():
+            Suggestion.objects.filter(user_id__in=batch).delete()
+            Suggestion.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+def for_user(user, size=None):
+    """Рекомендации для блока на странице подписок, одним запросом.
+
+    Авторы, на которых пользователь подписался после расчёта, отсеиваются.
+    """
+    return list(
+        Suggestion.objects.filter(user=user)
+        .exclude(author__following__user=user)
+        .select_related('author')
+        .order_by('rank')[:size or settings.SUGGESTIONS_SHOWN]
+    )
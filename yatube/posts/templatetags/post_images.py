@@ -0,0 +1,41 @@
+from django import template
+
+from posts import thumbnails, variants
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, alias='card'):
+    """Заранее нарезанная миниатюра поста или None, пока её нет."""
+    if not post.image:
+        return None
+    prefetched = getattr(post, 'prefetched_thumbnails', {})
+    if alias in prefetched:
+        return prefetched[alias]
+    return thumbnails.lookup(post.image, alias)
+
+
+@register.simple_tag
+def post_picture(post):
+    """Адаптивные варианты картинки поста или None, пока их нет."""
+    if not post.image:
+        return None
+    if not hasattr(post, 'prefetched_picture'):
+        variants.prefetch([post])
+    return post.prefetched_picture
+
+
+@register.simple_tag
+def prefetch_images(posts, alias='card'):
+    """Готовит картинки всей страницы заранее.
+
+    Один запрос за вариантами и одно обращение к хранилищу миниатюр
+    для постов, у которых вариантов ещё нет.
+    """
+    posts = list(posts)
+    variants.prefetch(posts)
+    thumbnails.prefetch(
+        [post for post in posts
+         if getattr(post, 'prefetched_picture', None) is None], alias)
+    return ''
@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import caching
+from posts.models import CacheScope, Comment, Group, Post
+
+User = get_user_model()
+
+
+class FeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='UserName')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug')
+        cls.other_group = Group.objects.create(
+            title='Другая группа', slug='other-slug')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Исходный текст')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def assertShows(self, url, text, shows=True):
+        content = self.client.get(url).content.decode()
+        self.assertEqual(text in content, shows)
+
+    def test_feeds_are_cached(self):
+        """Без сигналов изменения не видны: список берётся из кеша."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        ]
+        for url in urls:
+            self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertShows(url, 'Исходный текст')
+
+    def test_post_save_bumps_generations(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertShows(url, 'Новый текст')
+
+    def test_group_change_invalidates_old_group(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.other_group
+        post.save()
+        self.assertShows(url, 'Исходный текст', shows=False)
+
+    def test_comment_bumps_post_scopes(self):
+        before = caching.generation(caching.GLOBAL)
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        self.assertNotEqual(caching.generation(caching.GLOBAL), before)
+
+    def test_evicted_generation_is_not_reused(self):
+        """Потерянный счётчик не возвращается к старому значению."""
+        before = caching.generation(caching.GLOBAL)
+        caching.bump(caching.GLOBAL)
+        CacheScope.objects.filter(scope=caching.GLOBAL).delete()
+        self.assertNotEqual(caching.generation(caching.GLOBAL), before)
+
+    def test_bump_is_one_update(self):
+        caching.generation(caching.GLOBAL)
+        with self.assertNumQueries(1):
+            caching.bump(caching.GLOBAL)
+
+    def test_request_reads_scopes_once(self):
+        """За запрос поколение читается из базы один раз."""
+        caching.generation(caching.GLOBAL)
+        caching._start()
+        try:
+            with self.assertNumQueries(1):
+                caching.generation(caching.GLOBAL)
+                caching.modified(caching.GLOBAL)
+        finally:
+            caching._finish()
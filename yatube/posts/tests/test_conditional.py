@@ -0,0 +1,114 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import conditional
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост')
+        cls.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_page_is_not_modified(self):
+        """Повторный запрос с ETag получает 304 без рендера шаблона."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('no-cache', response['Cache-Control'])
+                with mock.patch('posts.views.render') as render:
+                    response = self.revalidate(url, response)
+                render.assert_not_called()
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                response = self.client.get(
+                    url,
+                    HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_edit_changes_etag(self):
+        responses = [self.client.get(url) for url in self.urls]
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Правка'
+        post.save()
+        for url, response in zip(self.urls, responses):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.revalidate(url, response).status_code, 200)
+
+    def test_comment_changes_post_page(self):
+        url = self.urls[3]
+        response = self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_states_do_not_aggregate(self):
+        """Состояние страницы — одна строка, без агрегатов по постам."""
+        states = [
+            (conditional.group_state, {'slug': self.group.slug}),
+            (conditional.profile_state, {'username': self.user.username}),
+            (conditional.post_state, {'post_id': self.post.pk}),
+        ]
+        for state_func, kwargs in states:
+            with self.subTest(state=state_func.__name__):
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertIsNotNone(state_func(**kwargs))
+                self.assertEqual(len(queries), 1)
+                sql = queries[0]['sql']
+                self.assertNotIn('COUNT(', sql)
+                self.assertNotIn('MAX(', sql)
+
+    def test_follow_changes_profile(self):
+        url = self.urls[2]
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_etag_depends_on_user_and_cursor(self):
+        url = self.urls[0]
+        anonymous = self.client.get(url)['ETag']
+        self.client.force_login(self.reader)
+        self.assertNotEqual(self.client.get(url)['ETag'], anonymous)
+        self.assertNotEqual(
+            self.client.get(url, {'cursor': 'x'})['ETag'],
+            self.client.get(url)['ETag'])
+
+    def test_missing_object_is_not_found(self):
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
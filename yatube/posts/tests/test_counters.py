@@ -0,0 +1,79 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import AuthorCounters, Comment, Follow, Post
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.post = Post.objects.create(author=self.author, text='Пост')
+
+    def counters(self, user):
+        return AuthorCounters.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.counters(self.author).post_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        self.post.delete()
+        self.assertEqual(self.counters(self.author).post_count, 0)
+
+    def test_follow_counters(self):
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.counters(self.author).follower_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.counters(self.author).follower_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_reconcile_counters_command(self):
+        Comment.objects.create(post=self.post, author=self.reader, text='1')
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorCounters.objects.update(
+            post_count=7, follower_count=7, following_count=7)
+        AuthorCounters.objects.filter(user=self.reader).delete()
+        Post.objects.update(comment_count=7)
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        author, reader = self.counters(self.author), self.counters(
+            self.reader)
+        self.assertEqual(
+            (author.post_count, author.follower_count,
+             author.following_count), (1, 1, 0))
+        self.assertEqual(
+            (reader.post_count, reader.follower_count,
+             reader.following_count), (0, 0, 1))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_pages_run_no_aggregates(self):
+        """Профиль и страница поста не считают COUNT(*)."""
+        urls = [
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = Client().get(url)
+                self.assertContains(response, 'постов')
+                for query in queries:
+                    self.assertNotIn('COUNT(', query['sql'])
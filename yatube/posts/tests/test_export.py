@@ -0,0 +1,89 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import export
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Группа', slug='group',
+            description='Описание, "с" кавычками')
+        Post.objects.bulk_create([
+            Post(author=cls.user, group=cls.group, text=f'Пост {number}\n')
+            for number in range(7)
+        ])
+        cls.post = Post.objects.first()
+        Comment.objects.create(post=cls.post, author=cls.staff, text='Да')
+        Follow.objects.create(user=cls.staff, author=cls.user)
+
+    def ndjson(self, data):
+        return [json.loads(line) for line in data.decode().splitlines()]
+
+    def test_ndjson_reads_in_batches(self):
+        with self.assertNumQueries(4):
+            data = b''.join(export.export('posts', batch_size=3))
+        items = self.ndjson(data)
+        self.assertEqual([item['id'] for item in items], list(
+            Post.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(set(items[0]), set(export.columns(Post)))
+
+    def test_csv(self):
+        data = b''.join(export.export('groups', 'csv')).decode()
+        header, row = list(csv.reader(io.StringIO(data)))
+        self.assertEqual(header, ['id', 'title', 'slug', 'description'])
+        self.assertEqual(row[3], self.group.description)
+
+    def test_gzip(self):
+        data = gzip.decompress(
+            b''.join(export.export('follows', compress=True)))
+        self.assertEqual(self.ndjson(data), [{
+            'id': Follow.objects.get().pk,
+            'user_id': self.staff.pk,
+            'author_id': self.user.pk,
+        }])
+
+    def test_command(self):
+        output = StringIO()
+        call_command('export_data', 'comments', stdout=output)
+        self.assertEqual(self.ndjson(output.getvalue().encode())[0]['text'],
+                         'Да')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'posts.csv.gz')
+            call_command('export_data', 'posts', '--format', 'csv', '--gzip',
+                         '--output', path)
+            with gzip.open(path, 'rt') as file:
+                self.assertEqual(len(list(csv.reader(file))), 8)
+
+    def test_endpoint_is_staff_only(self):
+        url = reverse('posts:export', args=['posts'])
+        client = Client()
+        client.force_login(self.user)
+        self.assertEqual(client.get(url).status_code, 302)
+        client.force_login(self.staff)
+        response = client.get(url, {'format': 'csv', 'gzip': ''})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('posts.csv.gz', response['Content-Disposition'])
+        data = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(list(csv.reader(io.StringIO(data.decode())))),
+                         8)
+        self.assertEqual(
+            client.get(reverse('posts:export', args=['users'])).status_code,
+            404)
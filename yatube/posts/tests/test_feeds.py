@@ -0,0 +1,100 @@
+from xml.etree import ElementTree
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+class FeedsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание группы')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост <в группе> & всё')
+        cls.other_post = Post.objects.create(
+            author=cls.other, text='Чужой пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get_feed(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, ElementTree.fromstring(
+            b''.join(response.streaming_content))
+
+    def atom_titles(self, url):
+        _, root = self.get_feed(url)
+        return [entry.find(f'{ATOM}title').text
+                for entry in root.iter(f'{ATOM}entry')]
+
+    def test_scopes(self):
+        cases = {
+            reverse('posts:index_feed', args=['atom']):
+                ['Чужой пост', 'Пост <в группе> & всё'],
+            reverse('posts:group_feed', args=[self.group.slug, 'atom']):
+                ['Пост <в группе> & всё'],
+            reverse('posts:profile_feed', args=[self.other.username, 'atom']):
+                ['Чужой пост'],
+        }
+        for url, titles in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.atom_titles(url), titles)
+
+    def test_rss(self):
+        response, root = self.get_feed(
+            reverse('posts:group_feed', args=[self.group.slug, 'rss']))
+        self.assertTrue(response['Content-Type'].startswith(
+            'application/rss+xml'))
+        item = root.find('channel/item')
+        self.assertEqual(item.find('description').text, self.post.text)
+        self.assertEqual(item.find('category').text, self.group.title)
+        self.assertTrue(item.find('link').text.endswith(
+            reverse('posts:post_detail', args=[self.post.pk])))
+
+    @override_settings(FEED_SIZE=1)
+    def test_feed_size_is_bounded(self):
+        self.assertEqual(
+            len(self.atom_titles(reverse('posts:index_feed', args=['atom']))),
+            1)
+
+    def test_unknown_format_and_object(self):
+        for url in (reverse('posts:index_feed', args=['json']),
+                    reverse('posts:group_feed', args=['missing', 'rss'])):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_cached_until_post_saved(self):
+        url = reverse('posts:index_feed', args=['atom'])
+        self.get_feed(url)
+        Post.objects.filter(pk=self.other_post.pk).update(text='Тихая правка')
+        # Дата последнего поста и поколение области, лента — из кеша
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertNotContains(response, 'Тихая правка')
+        post = Post.objects.get(pk=self.other_post.pk)
+        post.save()
+        self.assertIn('Тихая правка', self.atom_titles(url))
+
+    def test_conditional_get(self):
+        url = reverse('posts:profile_feed', args=[self.user.username, 'rss'])
+        response, _ = self.get_feed(url)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_pages_link_feeds(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response, reverse('posts:index_feed', args=['atom']))
@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts import graph
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class FollowGraphTest(TestCase):
+    def test_adjacency(self):
+        follows = graph.FollowGraph([(1, 3), (1, 2), (2, 3), (1, 3)])
+        self.assertEqual(list(follows.following.nodes), [1, 2])
+        self.assertEqual(list(follows.following.offsets), [0, 2, 3])
+        self.assertEqual(list(follows.following_ids(1)), [2, 3])
+        self.assertEqual(list(follows.follower_ids(3)), [1, 2])
+        self.assertTrue(follows.follows(2, 3))
+        self.assertFalse(follows.follows(3, 2))
+        self.assertEqual(follows.follower_count(4), 0)
+
+    def test_deltas_and_compaction(self):
+        follows = graph.FollowGraph([(1, 2), (1, 3)])
+        follows.add(1, 4)
+        follows.remove(1, 2)
+        follows.add(5, 3)
+        self.assertEqual(list(follows.following_ids(1)), [3, 4])
+        self.assertEqual(list(follows.follower_ids(3)), [1, 5])
+        self.assertEqual(follows.following_count(1), 2)
+        self.assertEqual(follows.users(), [1, 5])
+        self.assertEqual(follows.authors(), [3, 4])
+        copy = follows.copy()
+        copy.remove(1, 4)
+        self.assertTrue(follows.follows(1, 4))
+        compacted = follows.compacted()
+        self.assertEqual(compacted.pending(), 0)
+        self.assertEqual(list(compacted.following.edges()),
+                         [(1, 3), (1, 4), (5, 3)])
+
+    def test_profile_follow_button(self):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        client = Client()
+        client.force_login(reader)
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertFalse(client.get(url).context['following'])
+        Follow.objects.create(user=reader, author=author)
+        cache.clear()
+        response = client.get(url)
+        self.assertTrue(response.context['following'])
+        self.assertContains(response, 'Отписаться')
+
+    def test_transaction_reads_only_affected_rows(self):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        with mock.patch.object(graph, 'load') as load:
+            with self.assertNumQueries(1):
+                self.assertTrue(graph.follows(reader.pk, author.pk))
+        load.assert_not_called()
+
+    @override_settings(FOLLOW_ADMIN_FILTER_SIZE=1)
+    def test_admin_filter_lists_top_authors(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        star, other = (User.objects.create_user(username=name)
+                       for name in ('star', 'other'))
+        Follow.objects.bulk_create([
+            Follow(user=admin, author=star),
+            Follow(user=other, author=star),
+            Follow(user=admin, author=other),
+        ])
+        client = Client()
+        client.force_login(admin)
+        url = reverse('admin:posts_follow_changelist')
+        choices = client.get(url).context['cl'].filter_specs[1].lookup_choices
+        self.assertEqual(choices, [(star.pk, 'star')])
+        response = client.get(url, {'author': other.pk})
+        self.assertEqual(
+            response.context['cl'].filter_specs[1].lookup_choices,
+            [(star.pk, 'star'), (other.pk, 'other')])
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class CachedGraphTest(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        log = override_settings(
+            FOLLOW_GRAPH_LOG=os.path.join(directory, 'follows.log'))
+        log.enable()
+        self.addCleanup(log.disable)
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+
+    def test_signals_apply_deltas(self):
+        loaded = graph.get()
+        self.assertIs(graph.get(), loaded)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        # Граф догоняет журнал без запросов к базе
+        with self.assertNumQueries(0):
+            follows = graph.get()
+            self.assertTrue(follows.follows(self.reader.pk, self.author.pk))
+        follow.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(graph.get().follower_count(self.author.pk), 0)
+
+    def test_other_process_change_is_applied_from_log(self):
+        graph.get()
+        # Другой воркер подписался: строка в журнале, граф не перечитывается
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)])
+        graph.append(graph.bump(), self.reader.pk, self.author.pk, True)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                list(graph.get().following_ids(self.reader.pk)),
+                [self.author.pk])
+
+    def test_out_of_order_lines_wait_for_gap(self):
+        graph.get()
+        other = User.objects.create_user(username='other')
+        first, second = graph.bump(), graph.bump()
+        graph.append(second, other.pk, self.author.pk, True)
+        self.assertEqual(graph.get().follower_count(self.author.pk), 0)
+        graph.append(first, self.reader.pk, self.author.pk, True)
+        self.assertEqual(graph.get().follower_count(self.author.pk), 2)
+
+    @override_settings(FOLLOW_GRAPH_LOG_WAIT=0)
+    def test_lost_line_reloads(self):
+        graph.get()
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)])
+        graph.bump()
+        graph.append(graph.bump(), self.author.pk, self.reader.pk, True)
+        graph.get()
+        # Правки с пропущенной версией нет в журнале: граф из базы
+        self.assertTrue(graph.get().follows(self.reader.pk, self.author.pk))
+
+    def test_restarted_log_reloads(self):
+        graph.get()
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)])
+        graph.invalidate()
+        with self.assertNumQueries(3):
+            self.assertEqual(
+                list(graph.get().following_ids(self.reader.pk)),
+                [self.author.pk])
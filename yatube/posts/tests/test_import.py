@@ -0,0 +1,174 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from posts import importer, search
+from posts.models import AuthorCounters, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ImportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def ndjson(self, name, records):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return path
+
+    def local(self, kind, source_id):
+        return importer.mapped(kind, [source_id])[source_id]
+
+    def posts_file(self, count=5):
+        return self.ndjson('posts.ndjson', [
+            {
+                'id': 100 + number,
+                'author': 'author' if number % 2 else 'newcomer',
+                'group': 'group' if number % 2 else 'imported',
+                'text': f'Перенесённый пост {number}',
+                'pub_date': f'2019-01-0{number + 1}T10:00:00+00:00',
+            }
+            for number in range(count)
+        ])
+
+    def test_import_posts_and_comments(self):
+        call_command('import_content', 'posts', self.posts_file(),
+                     '--chunk-size', '2', '--batch-size', '1',
+                     '--no-rebuild', stdout=StringIO())
+        comments = self.ndjson('comments.ndjson', [
+            {'id': 1, 'post': 101, 'author': 'reader', 'text': 'Ответ',
+             'created': '2019-02-01T10:00:00+00:00'},
+            {'id': 2, 'post': 999, 'author': 'reader', 'text': 'Сирота',
+             'created': '2019-02-01T10:00:00+00:00'},
+        ])
+        output = StringIO()
+        call_command('import_content', 'comments', comments, stdout=output)
+        self.assertIn('пропущено: 1', output.getvalue())
+        post = Post.objects.get(pk=self.local('posts', 101))
+        self.assertEqual(post.author, self.author)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2019)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(Comment.objects.get().created.month, 2)
+        self.assertEqual(
+            Post.objects.get(pk=self.local('posts', 100)).group.slug,
+            'imported')
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertEqual(newcomer.counters.post_count, 3)
+        self.assertEqual(
+            AuthorCounters.objects.get(user=self.author).post_count, 2)
+        self.assertEqual(
+            set(self.reader.timeline.values_list('post_id', flat=True)),
+            {self.local('posts', 101), self.local('posts', 103)})
+        if search.enabled():
+            page = search.search_page('Перенесённый', None, 10)
+            self.assertEqual(len(page['posts']), 5)
+
+    def test_resume_from_checkpoint(self):
+        path = self.posts_file()
+        with open(path, 'rb') as file:
+            offset = len(file.readline()) + len(file.readline())
+        with open(f'{path}.checkpoint', 'w') as file:
+            json.dump({'offset': offset}, file)
+        call_command('import_content', 'posts', path, stdout=StringIO())
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            [f'Перенесённый пост {number}' for number in (2, 3, 4)])
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_failed_chunk_is_retried(self):
+        path = self.posts_file()
+        loader = importer.PostImporter(path, chunk_size=2)
+        write = loader.write
+        calls = []
+
+        def failing_write(records):
+            calls.append(records)
+            if len(calls) == 2:
+                raise RuntimeError('обрыв')
+            write(records)
+
+        with mock.patch.object(loader, 'write', failing_write):
+            with self.assertRaises(RuntimeError):
+                loader.run()
+        self.assertEqual(Post.objects.count(), 2)
+        loader = importer.PostImporter(path, chunk_size=2)
+        loader.run()
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(loader.created, 3)
+
+    def test_search_triggers_restored(self):
+        importer.PostImporter(self.posts_file(1)).run()
+        Post.objects.create(author=self.author, text='Обычный пост')
+        if search.enabled():
+            page = search.search_page('Обычный', None, 10)
+            self.assertEqual(len(page['posts']), 1)
+
+    def test_replayed_chunk_is_not_duplicated(self):
+        path = self.posts_file()
+        importer.PostImporter(path, chunk_size=2).run()
+        loader = importer.PostImporter(path, chunk_size=2)
+        loader.run()
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual((loader.created, loader.skipped), (0, 5))
+
+    def test_source_ids_do_not_collide_with_local_rows(self):
+        local = Post.objects.create(author=self.author, text='Местный пост')
+        path = self.ndjson('posts.ndjson', [{
+            'id': local.pk, 'author': 'author', 'text': 'Перенесённый',
+            'pub_date': '2019-01-01T10:00:00+00:00',
+        }])
+        loader = importer.PostImporter(path)
+        loader.run()
+        self.assertEqual(loader.created, 1)
+        imported = Post.objects.get(pk=self.local('posts', local.pk))
+        self.assertNotEqual(imported, local)
+        self.assertEqual(imported.text, 'Перенесённый')
+        comments = self.ndjson('comments.ndjson', [
+            {'id': 1, 'post': local.pk, 'author': 'reader',
+             'text': 'Вопрос', 'created': '2019-02-01T10:00:00+00:00'},
+            {'id': 2, 'post': local.pk, 'author': 'author',
+             'text': 'Ответ', 'created': '2019-02-02T10:00:00+00:00',
+             'parent': 1},
+        ])
+        importer.CommentImporter(comments).run()
+        self.assertFalse(local.comments.exists())
+        question, answer = imported.comments.order_by('created')
+        self.assertEqual(answer.parent, question)
+
+    def test_concurrent_insert_fails_loudly(self):
+        path = self.posts_file(2)
+        loader = importer.PostImporter(path)
+        bulk_create = Post.objects.bulk_create
+
+        def racing_bulk_create(objects, **kwargs):
+            Post.objects.create(author=self.author, text='Чужая вставка',
+                                pub_date=timezone.now())
+            return bulk_create(objects, **kwargs)
+
+        with mock.patch.object(Post.objects, 'bulk_create',
+                               racing_bulk_create):
+            with self.assertRaises(importer.ConcurrentInsert):
+                loader.run()
+        self.assertEqual(Post.objects.count(), 0)
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts import media, thumbnails
+from posts.models import MediaBlob, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_bytes(color=(0, 0, 200)):
+    file_obj = BytesIO()
+    Image.new('RGB', (60, 30), color=color).save(file_obj, 'png')
+    return file_obj.getvalue()
+
+
+def image_upload(name='picture.png', color=(0, 0, 200)):
+    return SimpleUploadedFile(
+        name, image_bytes(color), content_type='image/png')
+
+
+def post_images_save(name, color=(50, 50, 50)):
+    storage = Post._meta.get_field('image').storage
+    return storage.save(name, ContentFile(image_bytes(color)))
+
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class MediaStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def ref_count(self, name):
+        return MediaBlob.objects.get(name=name).ref_count
+
+    def test_name_is_content_digest(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=image_upload('Фото.PNG'))
+        digest = hashlib.sha256(image_bytes()).hexdigest()
+        self.assertEqual(
+            post.image.name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        with post.image.open() as file:
+            self.assertEqual(file.read(), image_bytes())
+
+    def test_same_upload_is_stored_once(self):
+        first = Post.objects.create(
+            author=self.user, text='Первый', image=image_upload('a.png'))
+        second = Post.objects.create(
+            author=self.user, text='Второй', image=image_upload('b.png'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.ref_count(first.image.name), 2)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory),
+                         [os.path.basename(first.image.path)])
+
+    def test_ref_count_follows_edit_and_delete(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=image_upload())
+        old_name = post.image.name
+        post.image = image_upload(color=(10, 10, 10))
+        post.save()
+        self.assertEqual(self.ref_count(old_name), 0)
+        self.assertEqual(self.ref_count(post.image.name), 1)
+        post.text = 'Без новой картинки'
+        post.save()
+        self.assertEqual(self.ref_count(post.image.name), 1)
+        new_name = post.image.name
+        post.delete()
+        self.assertEqual(self.ref_count(new_name), 0)
+
+    def test_reconcile_counts_posts(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=image_upload())
+        Post.objects.create(author=self.user, text='Копия', image=post.image)
+        MediaBlob.objects.all().delete()
+        media.reconcile(batch_size=1)
+        self.assertEqual(self.ref_count(post.image.name), 2)
+
+    def test_walk_finds_files_in_shards(self):
+        root = tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT)
+        expected = set()
+        for path in ('top.png', 'ab/cd/one.png', 'ab/ef/two.png',
+                     'ff/00/three.png'):
+            full = os.path.join(root, path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            open(full, 'wb').close()
+            expected.add(full)
+        self.assertEqual(
+            {path for path, _ in media.walk(root, workers=3)}, expected)
+
+    def test_gc_removes_only_unreferenced_old_files(self):
+        kept = Post.objects.create(
+            author=self.user, text='Пост', image=image_upload())
+        dropped = Post.objects.create(
+            author=self.user, text='Удалённый',
+            image=image_upload(color=(10, 10, 10)))
+        name = dropped.image.name
+        path = dropped.image.path
+        thumbnail = thumbnails.lookup(dropped.image, 'card')
+        variant = dropped.image_variants.first().name
+        dropped.delete()
+        young = post_images_save('posts/young.png')
+        orphan = post_images_save('posts/orphan.png', color=(1, 2, 3))
+        for old in (kept.image.path, path, default_storage.path(orphan)):
+            age(old, 7200)
+        call_command('gc_media', stdout=StringIO())
+        self.assertTrue(os.path.exists(kept.image.path))
+        self.assertTrue(default_storage.exists(
+            kept.image_variants.first().name))
+        self.assertTrue(os.path.exists(default_storage.path(young)))
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(default_storage.path(orphan)))
+        self.assertFalse(default_storage.exists(thumbnail.name))
+        self.assertFalse(default_storage.exists(variant))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_gc_dry_run_keeps_files(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=image_upload())
+        path = post.image.path
+        post.delete()
+        age(path, 7200)
+        output = StringIO()
+        call_command('gc_media', '--dry-run', stdout=output)
+        self.assertIn(os.path.basename(path), output.getvalue())
+        self.assertTrue(os.path.exists(path))
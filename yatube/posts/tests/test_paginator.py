@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from posts.models import Post
+from posts.utils import CursorPaginator
+
+User = get_user_model()
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='UserName')
+        Post.objects.bulk_create([
+            Post(text=f'Тестовый пост {x}', author=cls.user)
+            for x in range(25)
+        ])
+        # Одинаковая дата у всех постов: порядок держится только на pk.
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        cls.expected = list(Post.objects.order_by('-pk'))
+
+    def setUp(self):
+        self.paginator = CursorPaginator(Post.objects.all(), 10)
+
+    def test_pages_follow_next_cursor(self):
+        """Курсоры обходят все записи без пропусков и повторов."""
+        seen = []
+        page = self.paginator.get_page(None)
+        self.assertFalse(page.has_previous())
+        while True:
+            seen.extend(page)
+            if not page.has_next():
+                break
+            page = self.paginator.get_page(page.next_cursor)
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_cursor_returns_back(self):
+        first = self.paginator.get_page(None)
+        second = self.paginator.get_page(first.next_cursor)
+        back = self.paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_last_cursor(self):
+        page = self.paginator.get_page(self.paginator.last_cursor)
+        self.assertEqual(list(page), self.expected[-10:])
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        for cursor in ('garbage', 'WyJ4IiwxXQ==', 'WyJuIixbIngiXV0='):
+            with self.subTest(cursor=cursor):
+                page = self.paginator.get_page(cursor)
+                self.assertEqual(list(page), self.expected[:10])
+
+    def test_page_is_single_query(self):
+        """Страница читается одним запросом без COUNT(*)."""
+        cursor = self.paginator.get_page(None).next_cursor
+        with self.assertNumQueries(1):
+            self.paginator.get_page(cursor)
+
+    def test_next_page_is_index_range(self):
+        """Следующая страница ищется диапазоном по индексу, без сортировки."""
+        cursor = self.paginator.get_page(None).next_cursor
+        _, values = self.paginator.decode(cursor)
+        for queryset in (Post.objects.all(),
+                         Post.objects.filter(author=self.user)):
+            paginator = CursorPaginator(queryset, 10)
+            sql, params = paginator.object_list.filter(
+                paginator.keyset_filter(values))[:11].query.sql_with_params()
+            with connection.cursor() as db:
+                db.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = ' '.join(row[-1] for row in db.fetchall())
+            with self.subTest(plan=plan):
+                self.assertIn('pub_date<?', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+
+    def found(self, query, **kwargs):
+        return [post.pk for post in search.search_page(
+            query, **kwargs)['posts']]
+
+    def test_index_follows_table(self):
+        """Триггеры добавляют, изменяют и удаляют текст в индексе."""
+        post = Post.objects.create(author=self.user, text='Жёлтая подводная')
+        self.assertEqual(self.found('подводная'), [post.pk])
+        post.text = 'Зелёная надводная'
+        post.save()
+        self.assertEqual(self.found('подводная'), [])
+        self.assertEqual(self.found('надвод'), [post.pk])
+        post.delete()
+        self.assertEqual(self.found('надводная'), [])
+
+    def test_comments_find_their_post(self):
+        post = Post.objects.create(author=self.user, text='Без слова')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Редкое слово')
+        page = search.search_page('редкое')
+        self.assertEqual([found.pk for found in page['posts']], [post.pk])
+        self.assertIn('<mark>Редкое</mark>', page['posts'][0].snippet)
+        Comment.objects.filter(pk=comment.pk).update(active=False)
+        self.assertEqual(self.found('редкое'), [])
+
+    def test_post_text_ranks_above_comment(self):
+        by_comment = Post.objects.create(author=self.user, text='Прочее')
+        Comment.objects.create(
+            post=by_comment, author=self.user, text='Кактус')
+        by_text = Post.objects.create(author=self.user, text='Кактус')
+        self.assertEqual(self.found('кактус'), [by_text.pk, by_comment.pk])
+
+    def test_keyset_pages_cover_all_results(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Море номер {number}')
+            for number in range(5))
+        seen, cursor = [], None
+        while True:
+            page = search.search_page('море', cursor=cursor, per_page=2)
+            seen.extend(post.pk for post in page['posts'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertCountEqual(
+            seen, Post.objects.values_list('pk', flat=True))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_query_syntax_is_not_injected(self):
+        Post.objects.create(author=self.user, text='Текст "в кавычках"')
+        for query in ('"', 'NEAR(', 'в* OR', '-', ''):
+            with self.subTest(query=query):
+                search.search_page(query)
+
+    def test_snippet_is_escaped(self):
+        Post.objects.create(author=self.user, text='<b>жирный</b> шрифт')
+        snippet = search.search_page('шрифт')['posts'][0].snippet
+        self.assertIn('&lt;b&gt;', snippet)
+        self.assertIn('<mark>шрифт</mark>', snippet)
+
+    def test_search_page(self):
+        Post.objects.create(author=self.user, text='Поиск работает')
+        response = Client().get(reverse('posts:search'), {'q': 'работает'})
+        self.assertContains(response, '<mark>работает</mark>')
+
+    def test_admin_uses_index(self):
+        posts = [
+            Post.objects.create(author=self.user, text='Админский текст'),
+            Post.objects.create(author=self.user, text='Снова админский'),
+        ]
+        Post.objects.create(author=self.user, text='Другое')
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'админ'})
+        self.assertEqual(
+            {found.pk for found in response.context['cl'].result_list},
+            {post.pk for post in posts})
@@ -0,0 +1,29 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import TestCase
+
+from posts.models import AuthorCounters, Comment, Follow, Post
+
+User = get_user_model()
+
+
+class SeedCommandTest(TestCase):
+    def test_seed_yatube(self):
+        call_command(
+            'seed_yatube', users=20, posts=200, follows_per_user=3,
+            comments_per_post=2, groups=2, seed=1, chunk_size=50,
+            stdout=StringIO())
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Follow.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 400)
+        self.assertFalse(Follow.objects.values('user', 'author').annotate(
+            total=Count('pk')).filter(total__gt=1).exists())
+        top = AuthorCounters.objects.order_by('-post_count').first()
+        self.assertEqual(
+            top.post_count, Post.objects.filter(author=top.user).count())
+        # Распределение Ципфа: у первого автора больше всех постов.
+        self.assertEqual(top.user, User.objects.order_by('pk').first())
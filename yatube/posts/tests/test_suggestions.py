@@ -0,0 +1,65 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import suggestions
+from posts.models import Follow, Suggestion
+
+User = get_user_model()
+
+
+class SuggestionsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        names = ['reader', 'friend', 'friend_pick', 'other', 'taste',
+                 'popular']
+        cls.users = {name: User.objects.create_user(username=name)
+                     for name in names}
+        follows = [
+            ('reader', 'friend'),
+            ('friend', 'friend_pick'),
+            ('other', 'friend'),
+            ('other', 'taste'),
+            ('taste', 'popular'),
+            ('friend_pick', 'popular'),
+        ]
+        Follow.objects.bulk_create([
+            Follow(user=cls.users[user], author=cls.users[author])
+            for user, author in follows
+        ])
+
+    def suggested(self, user):
+        return [suggestion.author.username
+                for suggestion in suggestions.for_user(user, size=10)]
+
+    def test_build_and_block(self):
+        output = StringIO()
+        call_command('build_suggestions', '--size', '3', '--batch-size', '2',
+                     stdout=output)
+        self.assertIn('Рекомендаций записано', output.getvalue())
+        reader = self.users['reader']
+        self.assertEqual(
+            self.suggested(reader), ['friend_pick', 'taste', 'popular'])
+        self.assertFalse(
+            Suggestion.objects.filter(user=reader, author=reader).exists())
+        client = Client()
+        client.force_login(reader)
+        Follow.objects.create(user=reader, author=self.users['friend_pick'])
+        with self.assertNumQueries(1):
+            shown = self.suggested(reader)
+        self.assertEqual(shown, ['taste', 'popular'])
+        response = client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Кого почитать')
+        self.assertEqual(
+            [item.author for item in response.context['suggestions']],
+            [self.users['taste'], self.users['popular']])
+
+    def test_rebuild_replaces_rows(self):
+        suggestions.build(size=2)
+        suggestions.build(size=1)
+        self.assertEqual(
+            Suggestion.objects.filter(user=self.users['reader']).count(), 1)
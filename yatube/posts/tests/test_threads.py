@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import threads
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=2, COMMENT_REPLIES=2,
+                   COMMENT_MAX_DEPTH=3)
+class ThreadsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.roots = [cls.comment(f'Корень {number}') for number in range(3)]
+        root = cls.roots[0]
+        cls.first = cls.comment('Ответ 1', root)
+        cls.nested = cls.comment('Ответ на ответ', cls.first)
+        cls.second = cls.comment('Ответ 2', root)
+        cls.third = cls.comment('Ответ 3', root)
+
+    @classmethod
+    def comment(cls, text, parent=None):
+        return Comment.objects.create(
+            post=cls.post, author=cls.user, text=text, parent=parent)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_paths(self):
+        root = self.roots[0]
+        self.assertEqual(len(root.path), threads.SEGMENT)
+        self.assertEqual(self.nested.depth, 2)
+        self.assertTrue(self.nested.path.startswith(self.first.path))
+        self.assertEqual(
+            [comment.text for comment in threads.whole_thread(root)],
+            ['Корень 0', 'Ответ 1', 'Ответ на ответ', 'Ответ 2', 'Ответ 3'])
+
+    def test_page_in_one_query(self):
+        """Новые ветки первыми, у каждой — первые ответы по порядку."""
+        with self.assertNumQueries(1):
+            page = threads.thread_page(self.post.pk)
+            texts = [comment.text for comment in page]
+        self.assertEqual(texts, ['Корень 2', 'Корень 1'])
+        self.assertEqual(page.next_cursor, self.roots[1].path)
+        with self.assertNumQueries(1):
+            page = list(threads.thread_page(self.post.pk, page.next_cursor))
+        self.assertEqual(
+            [comment.text for comment in page],
+            ['Корень 0', 'Ответ 1', 'Ответ на ответ'])
+        self.assertEqual(page[-1].more_replies, self.roots[0].pk)
+
+    def test_reply_view(self):
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Глубже некуда', 'parent': self.nested.pk})
+        reply = Comment.objects.get(text='Глубже некуда')
+        self.assertEqual(reply.parent_id, self.first.pk)
+        self.assertEqual(reply.depth, 2)
+        response = self.client.get(reverse(
+            'posts:comment_thread',
+            kwargs={'post_id': self.post.pk, 'comment_id': self.roots[0].pk}))
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Корень 0', 'Ответ 1', 'Ответ на ответ', 'Глубже некуда',
+             'Ответ 2', 'Ответ 3'])
+
+    def test_fill_paths(self):
+        Comment.objects.update(path='', depth=0)
+        threads.fill_paths(batch_size=2)
+        self.assertEqual(
+            Comment.objects.get(pk=self.nested.pk).path, self.nested.path)
+        self.assertFalse(Comment.objects.filter(path='').exists())
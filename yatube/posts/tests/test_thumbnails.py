@@ -0,0 +1,111 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_upload(name='picture.png'):
+    file_obj = BytesIO()
+    Image.new('RGB', (60, 30), color=(200, 0, 0)).save(file_obj, 'png')
+    return SimpleUploadedFile(
+        name, file_obj.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_upload_generates_thumbnails(self):
+        self.client.post(reverse('posts:post_create'), data={
+            'text': 'С картинкой', 'image': image_upload()})
+        post = Post.objects.get(text='С картинкой')
+        thumbnail = thumbnails.lookup(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual(tuple(thumbnail.size), (960, 339))
+        self.assertTrue(post.image_variants.exists())
+
+    def test_lookup_matches_sorl_name(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=image_upload())
+        geometry, options = settings.POST_THUMBNAILS['card']
+        self.assertEqual(
+            thumbnails.thumbnail_file(post.image, geometry, options).name,
+            get_thumbnail(post.image, geometry, **options).name)
+
+    def test_pending_thumbnail_falls_back_to_original(self):
+        """Картинка без миниатюры не режется во время рендера."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        Post.objects.filter(pk=post.pk).update(image='posts/missing.png')
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, '/media/posts/missing.png')
+
+    def test_warm_thumbnails_command(self):
+        with override_settings(POST_THUMBNAILS={}):
+            post = Post.objects.create(
+                author=self.user, text='Пост', image=image_upload())
+        self.assertIsNone(thumbnails.lookup(post.image, 'card'))
+        call_command('warm_thumbnails', stdout=StringIO())
+        self.assertIsNotNone(thumbnails.lookup(post.image, 'card'))
+
+    def kvstore_queries(self, queries):
+        return [query for query in queries
+                if 'thumbnail_kvstore' in query['sql']]
+
+    @override_settings(POST_IMAGE_FORMATS=())
+    def test_feed_page_reads_thumbnail_store_once(self):
+        """Пока нет вариантов, миниатюры страницы читаются одним запросом."""
+        for number in range(3):
+            Post.objects.create(author=self.user, text=f'Пост {number}',
+                                image=image_upload(f'picture{number}.png'))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(len(self.kvstore_queries(queries)), 1)
+        for post in response.context['page_obj']:
+            self.assertContains(
+                response, thumbnails.lookup(post.image, 'card').url)
+
+    def test_prefetch_uses_cache_after_first_page(self):
+        posts = [Post.objects.create(
+            author=self.user, text='Пост', image=image_upload())]
+        posts.append(Post.objects.create(author=self.user, text='Без'))
+        thumbnails.prefetch(posts, 'card')
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails.prefetch(posts, 'card')
+        self.assertEqual(self.kvstore_queries(queries), [])
+        self.assertEqual(
+            posts[0].prefetched_thumbnails['card'].name,
+            thumbnails.lookup(posts[0].image, 'card').name)
+        self.assertFalse(hasattr(posts[1], 'prefetched_thumbnails'))
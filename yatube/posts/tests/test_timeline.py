@@ -0,0 +1,158 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.old_post = Post.objects.create(
+            author=cls.author, text='Старый пост')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def timeline_posts(self):
+        return [entry.post for entry in self.reader.timeline.all()]
+
+    def test_follow_backfills_timeline(self):
+        """После подписки старые посты автора попадают в ленту."""
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertEqual(self.timeline_posts(), [self.old_post])
+
+    def test_new_post_fans_out(self):
+        """Новый пост сразу раскладывается в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.timeline_posts(), [post, self.old_post])
+
+    def test_unfollow_trims_timeline(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.timeline_posts(), [])
+
+    def test_follow_index_reads_timeline(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.filter(pk=self.old_post.pk).update(text='Изменён')
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Изменён'])
+
+    def test_rebuild_timelines_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline_posts(), [self.old_post])
+
+    def test_follow_batches_cover_all_follows(self):
+        other = User.objects.create_user(username='other')
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=self.author),
+            Follow(user=other, author=self.author),
+            Follow(user=self.reader, author=other),
+        ])
+        batches = list(timeline.follow_batches(batch_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+        self.assertEqual(
+            [(user_id, author_id) for batch in batches
+             for _, user_id, author_id in batch],
+            list(Follow.objects.order_by('pk').values_list(
+                'user_id', 'author_id')))
+
+
+@override_settings(TIMELINE_FANOUT_LIMIT=2)
+class HybridTimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.author = User.objects.create_user(username='author')
+        cls.celebrity = User.objects.create_user(username='celebrity')
+        cls.star = User.objects.create_user(username='star')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for celebrity in (cls.celebrity, cls.star):
+            Follow.objects.create(user=cls.reader, author=celebrity)
+            Follow.objects.create(user=cls.fan, author=celebrity)
+        authors = [cls.author, cls.celebrity, cls.star]
+        cls.posts = [
+            Post.objects.create(author=authors[x % 3], text=f'Пост {x}')
+            for x in range(15)
+        ]
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    @override_settings(TIMELINE_BACKFILL_SIZE=3)
+    def test_rebuild_matches_backfill(self):
+        """Пересборка кладёт в ленты то же, что подписка и fan-out."""
+        entries = TimelineEntry.objects.order_by('user', 'post').values_list(
+            'user_id', 'post_id', 'author_id', 'pub_date')
+        expected = list(entries)
+        timeline.rebuild(batch_size=1)
+        self.assertEqual(list(entries), expected)
+        TimelineEntry.objects.all().delete()
+        Follow.objects.filter(author=self.author).delete()
+        Follow.objects.create(user=self.reader, author=self.author)
+        timeline.rebuild()
+        self.assertEqual(
+            [entry.post for entry in self.reader.timeline.all()],
+            [post for post in self.posts[::-1]
+             if post.author == self.author][:3])
+
+    def test_celebrity_posts_are_not_pushed(self):
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.celebrity).exists())
+        self.assertEqual(
+            self.reader.timeline.count(),
+            Post.objects.filter(author=self.author).count())
+
+    def test_former_celebrity_posts_stay_in_feed(self):
+        """Автор опустился ниже порога: его посты переезжают в ленты."""
+        posts = list(Post.objects.filter(
+            author=self.celebrity).values_list('pk', flat=True))
+        Follow.objects.filter(user=self.fan, author=self.celebrity).delete()
+        self.assertEqual(
+            set(self.reader.timeline.filter(
+                author=self.celebrity).values_list('post_id', flat=True)),
+            set(posts))
+        feed = timeline.feed_paginator(self.reader, 20).get_page(None)
+        self.assertEqual(list(feed), self.posts[::-1])
+
+    def test_celebrities_are_one_source(self):
+        """Посты всех знаменитостей читаются одним запросом."""
+        paginator = timeline.feed_paginator(self.reader, 5)
+        self.assertEqual(len(paginator.sources), 2)
+        with self.assertNumQueries(2):
+            page = paginator.get_page(None)
+        self.assertEqual(list(page), self.posts[::-1][:5])
+
+    def test_follow_index_merges_pulled_posts(self):
+        """Лента сливает свои записи с постами знаменитостей по порядку."""
+        url = reverse('posts:follow_index')
+        page = self.reader_client.get(url).context['page_obj']
+        seen = list(page)
+        while page.has_next():
+            page = self.reader_client.get(
+                url, {'cursor': page.next_cursor}).context['page_obj']
+            seen.extend(page)
+        self.assertEqual(seen, self.posts[::-1])
+        back = self.reader_client.get(
+            url, {'cursor': page.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), self.posts[::-1][:10])
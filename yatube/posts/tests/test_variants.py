@@ -0,0 +1,105 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from posts import variants
+from posts.models import ImageVariant, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def photo_upload(name='photo.jpg', size=(1400, 700)):
+    file_obj = BytesIO()
+    exif = Image.Exif()
+    exif[0x010F] = 'Камера автора'
+    Image.new('RGB', size, color=(0, 120, 0)).save(
+        file_obj, 'jpeg', exif=exif)
+    return SimpleUploadedFile(
+        name, file_obj.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageVariantsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_variants_for_every_width_and_format(self):
+        post = Post.objects.create(
+            author=self.user, text='Фото', image=photo_upload())
+        self.assertEqual(
+            sorted(post.image_variants.values_list('format', 'width')),
+            sorted((image_format, width)
+                   for image_format in settings.POST_IMAGE_FORMATS
+                   for width in settings.POST_IMAGE_WIDTHS))
+        for variant in post.image_variants.all():
+            with default_storage.open(variant.name) as file:
+                image = Image.open(file)
+                self.assertEqual(image.format, variant.format)
+                self.assertEqual(image.size, (variant.width, variant.height))
+                self.assertNotIn('exif', image.info)
+                if variant.format == 'JPEG':
+                    self.assertTrue(image.info.get('progressive'))
+
+    def test_small_image_is_not_upscaled(self):
+        post = Post.objects.create(
+            author=self.user, text='Фото',
+            image=photo_upload(size=(500, 250)))
+        self.assertEqual(
+            set(post.image_variants.values_list('width', flat=True)),
+            {320})
+
+    def test_new_image_replaces_variants(self):
+        post = Post.objects.create(
+            author=self.user, text='Фото', image=photo_upload())
+        post.image = photo_upload('other.jpg')
+        post.save()
+        self.assertEqual(
+            set(post.image_variants.values_list('source', flat=True)),
+            {post.image.name})
+
+    def test_stale_result_is_dropped(self):
+        """Нарезка старой картинки не затирает варианты новой."""
+        post = Post.objects.create(
+            author=self.user, text='Фото', image=photo_upload())
+        old = post.image.name
+        ImageVariant.objects.all().delete()
+        Post.objects.filter(pk=post.pk).update(image='posts/new.jpg')
+        variants.generate(post.pk, old)
+        self.assertFalse(post.image_variants.exists())
+
+    def test_feed_renders_srcset_with_one_query(self):
+        for number in range(3):
+            Post.objects.create(author=self.user, text=f'Фото {number}',
+                                image=photo_upload(f'photo{number}.jpg'))
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(reverse('posts:index'))
+        variant_queries = [query for query in queries
+                           if 'posts_imagevariant' in query['sql']]
+        self.assertEqual(len(variant_queries), 1)
+        content = response.content.decode()
+        self.assertEqual(content.count('<source type="image/webp"'), 3)
+        self.assertIn('loading="lazy"', content)
+        self.assertIn('1280w', content)
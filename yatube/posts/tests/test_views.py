@@ -3,11 +3,13 @@ from http import HTTPStatus
 
 from django import forms
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
 
-from posts.models import Group, Post, Follow
+from core.query_budget import assert_query_budget
+from posts import threads
+from posts.models import Comment, Group, Post, Follow
 
 User = get_user_model()
 
@@ -68,9 +70,13 @@ class PostPagesTest(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self. assertEqual(len(response.context['page_obj']), 10)
 
+    def next_page(self, url):
+        first_page = self.authorized_client.get(url).context['page_obj']
+        return self.authorized_client.get(
+            url, {'cursor': first_page.next_cursor})
+
     def test_index_second_page_contains_three_records(self):
-        response = self.authorized_client.get(reverse(
-            'posts:index') + '?page=2')
+        response = self.next_page(reverse('posts:index'))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self. assertEqual(len(response.context['page_obj']), 3)
 
@@ -81,8 +87,8 @@ class PostPagesTest(TestCase):
         self.assertEqual(len(response.context['page_obj']), 10)
 
     def test_group_paginator_second_page(self):
-        response = self.authorized_client.get(reverse(
-            'posts:group_list', kwargs={'slug': self.group.slug}) + '?page=2')
+        response = self.next_page(reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug}))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self. assertEqual(len(response.context['page_obj']), 3)
 
@@ -93,9 +99,8 @@ class PostPagesTest(TestCase):
         self. assertEqual(len(response.context['page_obj']), 10)
 
     def test_profile_paginator_second_page(self):
-        response = self.authorized_client.get(reverse(
-            'posts:profile',
-            kwargs={'username': self.user.username}) + '?page=2')
+        response = self.next_page(reverse(
+            'posts:profile', kwargs={'username': self.user.username}))
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self. assertEqual(len(response.context['page_obj']), 3)
 
@@ -163,6 +168,31 @@ class PostPagesTest(TestCase):
                     response.context['form'].fields['image'],
                     forms.fields.ImageField)
 
+    def test_pages_fit_query_budget(self):
+        """Страницы не выходят за бюджет запросов: нет N+1."""
+        post = self.posts[0]
+        Comment.objects.bulk_create([
+            Comment(post=post, author=self.user_no_posts, text=f'Ок {x}')
+            for x in range(5)
+        ])
+        Follow.objects.create(user=self.user_no_posts, author=self.user)
+        pages = {
+            'posts:index': (self.authorized_client, {}),
+            'posts:group_list': (
+                self.authorized_client, {'slug': self.group.slug}),
+            'posts:profile': (
+                self.authorized_client, {'username': self.user.username}),
+            'posts:post_detail': (
+                self.authorized_client, {'post_id': post.pk}),
+            'posts:follow_index': (self.authorized_client_no_posts, {}),
+        }
+        for view_name, (client, kwargs) in pages.items():
+            with self.subTest(view_name=view_name):
+                cache.clear()
+                with assert_query_budget(view_name):
+                    response = client.get(reverse(view_name, kwargs=kwargs))
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
     def test_new_post_not_in_incorrect_group(self):
         response = self.authorized_client.get(reverse(
             'posts:group_list', kwargs={'slug': self.group_no_posts.slug}
@@ -217,6 +247,25 @@ class FollowViewsTest(TestCase):
                 kwargs={'username': self.post_follower}))
         self.assertEqual(Follow.objects.count(), count_follow - 1)
 
+    def test_repeated_follow_and_unfollow(self):
+        """Повторные клики не плодят подписки и не роняют отписку."""
+        url = reverse(
+            'posts:profile_follow', kwargs={'username': self.post_follower})
+        for _ in range(2):
+            response = self.follower_client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(Follow.objects.filter(
+            user=self.post_autor, author=self.post_follower).count(), 1)
+        self.post_follower.counters.refresh_from_db()
+        self.assertEqual(self.post_follower.counters.follower_count, 1)
+        url = reverse(
+            'posts:profile_unfollow', kwargs={'username': self.post_follower})
+        for _ in range(2):
+            response = self.follower_client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertFalse(Follow.objects.filter(
+            user=self.post_autor, author=self.post_follower).exists())
+
     def test_follow_on_authors(self):
         """Проверка записей у тех кто подписан."""
         post = Post.objects.create(
@@ -237,3 +286,50 @@ class FollowViewsTest(TestCase):
         response = self.author_client.get(
             reverse('posts:follow_index'))
         self.assertNotIn(post, response.context['page_obj'].object_list)
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentsPageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {x}')
+            for x in range(7)
+        ])
+        threads.fill_paths()
+        Comment.objects.filter(text='Комментарий 6').update(active=False)
+        cls.expected = list(Comment.objects.filter(active=True).order_by(
+            '-created', '-pk'))
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_first_page_and_fragments(self):
+        """Страница поста показывает первую порцию, остальное догружается."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        seen = list(response.context['comments'])
+        cursor = response.context['comments'].next_cursor
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        while cursor:
+            # Состояние поста, поколение области автора и порция веток
+            with self.assertNumQueries(3):
+                response = self.client.get(url, {'cursor': cursor})
+            self.assertTemplateNotUsed(response, 'base.html')
+            seen.extend(response.context['comments'])
+            cursor = response.context['comments'].next_cursor
+        self.assertEqual(seen, self.expected)
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_inactive_comments_hidden(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertContains(response, 'Комментарий 5')
+        self.assertContains(response, 'Показать ещё')
+        self.assertNotIn(
+            'Комментарий 6',
+            [comment.text for comment in response.context['comments']])
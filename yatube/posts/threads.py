@@ -0,0 +1,155 @@
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Comment
+from .utils import RawSubquery
+
+# Путь комментария — цепочка сегментов фиксированной ширины от корня
+# ветки. Сегмент корня — дополнение id до 10**SEGMENT - 1, поэтому по
+# возрастанию пути новые ветки идут первыми; сегменты ответов — сами id,
+# ответы внутри ветки идут по времени. Сортировка по пути — это обход
+# дерева в глубину прямо по индексу (post, path).
+SEGMENT = 10
+ROOT_BASE = 10 ** SEGMENT - 1
+# Больше любой цифры: путь + END — верхняя граница поддерева
+END = ':'
+BATCH_SIZE = 1000
+
+# id комментариев страницы: per_page + 1 корней после курсора и первые
+# строки каждой ветки; каждая ветка читается своим диапазоном по индексу
+PAGE_IDS = f'''
+SELECT thread.id FROM (
+    SELECT path FROM posts_comment
+    WHERE post_id = %s AND depth = 0 AND active AND path > %s
+    ORDER BY path
+    LIMIT %s
+) AS root
+JOIN posts_comment AS thread ON thread.id IN (
+    SELECT id FROM posts_comment
+    WHERE post_id = %s AND active
+        AND path >= root.path AND path < root.path || '{END}'
+    ORDER BY path
+    LIMIT %s
+)
+'''
+
+
+def segment(pk, root):
+    return f'{ROOT_BASE - pk if root else pk:0{SEGMENT}d}'
+
+
+def path_for(pk, parent_path=None):
+    if parent_path is None:
+        return segment(pk, root=True)
+    return parent_path + segment(pk, root=False)
+
+
+def depth_of(path):
+    return len(path) // SEGMENT - 1
+
+
+def assign_path(comment):
+    """Записывает путь только что созданного комментария."""
+    parent_path = None
+    if comment.parent_id is not None:
+        parent_path = Comment.objects.filter(
+            pk=comment.parent_id).values_list('path', flat=True).first()
+    comment.path = path_for(comment.pk, parent_path)
+    comment.depth = depth_of(comment.path)
+    Comment.objects.filter(pk=comment.pk).update(
+        path=comment.path, depth=comment.depth)
+
+
+def fill_paths(batch_size=BATCH_SIZE):
+    """Проставляет пути комментариям, вставленным в обход сигналов.
+
+    Сначала корни, затем ответы тех, у чьих родителей путь уже есть,
+    пока такие остаются.
+    """
+    pending = Comment.objects.filter(path='').filter(
+        Q(parent__isnull=True) | ~Q(parent__path=''))
+    while True:
+        rows = list(pending.order_by('pk').values_list(
+            'pk', 'parent__path')[:batch_size])
+        if not rows:
+            return
+        comments = []
+        for pk, parent_path in rows:
+            path = path_for(pk, parent_path)
+            comments.append(Comment(pk=pk, path=path, depth=depth_of(path)))
+        Comment.objects.bulk_update(comments, ['path', 'depth'])
+
+
+def reply_parent(parent):
+    """Родитель ответа: глубже ``COMMENT_MAX_DEPTH`` ответы не вкладываются."""
+    if parent.depth + 1 >= settings.COMMENT_MAX_DEPTH:
+        return parent.parent_id
+    return parent.pk
+
+
+def valid_cursor(cursor):
+    return bool(cursor) and len(cursor) == SEGMENT and cursor.isdigit()
+
+
+class ThreadPage:
+    """Комментарии страницы в порядке обхода дерева.
+
+    У последнего показанного комментария обрезанной ветки есть
+    ``more_replies`` — id корня, ветку которого можно догрузить целиком.
+    """
+
+    def __init__(self, comments, next_cursor, has_previous):
+        self.comments = comments
+        self.next_cursor = next_cursor
+        self.previous = has_previous
+
+    def __iter__(self):
+        return iter(self.comments)
+
+    def __len__(self):
+        return len(self.comments)
+
+    def has_previous(self):
+        return self.previous
+
+
+def thread_page(post_id, cursor=None, per_page=None, replies=None):
+    """Страница веток поста одним запросом.
+
+    ``per_page`` корней после ``cursor`` (пути последнего корня прошлой
+    страницы) и у каждого первые ``replies`` ответов. Порядок задаёт
+    ORDER BY path в SQL.
+    """
+    per_page = per_page or settings.COMMENTS_PER_PAGE
+    replies = settings.COMMENT_REPLIES if replies is None else replies
+    if not valid_cursor(cursor):
+        cursor = None
+    ids = RawSubquery(PAGE_IDS, (
+        post_id, cursor or '', per_page + 1, post_id, replies + 2))
+    rows = list(Comment.objects.filter(pk__in=ids).select_related(
+        'author').order_by('path'))
+    threads = []
+    for comment in rows:
+        if comment.depth == 0:
+            threads.append([comment])
+        elif threads and comment.path.startswith(threads[-1][0].path):
+            threads[-1].append(comment)
+    next_cursor = None
+    if len(threads) > per_page:
+        threads = threads[:per_page]
+        next_cursor = threads[-1][0].path
+    comments = []
+    for thread in threads:
+        if len(thread) > replies + 1:
+            thread = thread[:replies + 1]
+            thread[-1].more_replies = thread[0].pk
+        comments.extend(thread)
+    return ThreadPage(comments, next_cursor, cursor is not None)
+
+
+def whole_thread(root):
+    """Вся ветка корня ``root`` одним диапазоном по индексу."""
+    return Comment.objects.filter(
+        post_id=root.post_id, active=True,
+        path__gte=root.path, path__lt=root.path + END,
+    ).select_related('author').order_by('path')
@@ -0,0 +1,167 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import caching, variants
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+def thumbnail_file(file_, geometry, options):
+    """ImageFile миниатюры под тем же именем, что выдаст ``get_thumbnail``.
+
+    Повторяет подстановку опций по умолчанию из sorl, но не читает
+    и не режет исходную картинку.
+    """
+    backend = default.backend
+    source = ImageFile(file_)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def lookup(file_, alias):
+    """Готовая миниатюра из хранилища sorl или None, если её ещё нет."""
+    geometry, options = settings.POST_THUMBNAILS[alias]
+    return default.kvstore.get(thumbnail_file(file_, geometry, options))
+
+
+def _get_many_raw(keys):
+    """Пакетный ``_get_raw`` хранилища sorl.
+
+    Один get_many к кешу и не больше одного запроса к БД за промахами;
+    отсутствующие ключи кешируются как пустые, как и в sorl.
+    """
+    store = default.kvstore
+    if not isinstance(store, cached_db_kvstore.KVStore):
+        return {key: store._get_raw(key) for key in keys}
+    empty = cached_db_kvstore.EMPTY_VALUE
+    values = store.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        fetched = {key: found.get(key, empty) for key in missing}
+        store.cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {key: None if value == empty else value
+            for key, value in values.items()}
+
+
+def lookup_many(files, alias):
+    """Готовые миниатюры нескольких картинок: имя картинки -> ImageFile."""
+    geometry, options = settings.POST_THUMBNAILS[alias]
+    keys = {
+        add_prefix(thumbnail_file(file_, geometry, options).key): file_.name
+        for file_ in files
+    }
+    if not keys:
+        return {}
+    return {
+        keys[key]: deserialize_image_file(value)
+        for key, value in _get_many_raw(list(keys)).items()
+        if value is not None
+    }
+
+
+def prefetch(posts, alias):
+    """Кладёт в ``post.prefetched_thumbnails`` миниатюры всей страницы."""
+    posts = [post for post in posts if post.image]
+    found = lookup_many([post.image for post in posts], alias)
+    for post in posts:
+        post.__dict__.setdefault('prefetched_thumbnails', {})[alias] = (
+            found.get(post.image.name))
+
+
+def source_file(name):
+    """Картинка поста по имени с тем же хранилищем, что у ``Post.image``.
+
+    Хранилище входит в ключ sorl, поэтому миниатюры, нарезанные по имени,
+    должны находиться и по ``post.image``.
+    """
+    return ImageFile(name, variants.image_storage())
+
+
+def generate(name):
+    """Нарезает все миниатюры из ``POST_THUMBNAILS`` для файла ``name``."""
+    source = source_file(name)
+    for geometry, options in settings.POST_THUMBNAILS.values():
+        get_thumbnail(source, geometry, **options)
+
+
+def process(post_id, name):
+    """Миниатюры и адаптивные варианты картинки поста."""
+    try:
+        generate(name)
+        variants.generate(post_id, name)
+    except Exception:
+        # Пост уже сохранён: без миниатюр шаблон покажет оригинал
+        logger.exception('Не удалось нарезать картинку %s', name)
+
+
+def _pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+            _slots = threading.BoundedSemaphore(
+                settings.THUMBNAIL_QUEUE_SIZE)
+    return _executor, _slots
+
+
+def _run(post_id, name, scopes, slots):
+    try:
+        process(post_id, name)
+        # Закешированные списки могли успеть сохранить запасной вариант
+        caching.bump(*scopes)
+    finally:
+        slots.release()
+        connections.close_all()
+
+
+def _submit(post_id, name, scopes):
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        logger.warning('Очередь миниатюр заполнена, %s пропущен', name)
+        return
+    executor.submit(_run, post_id, name, scopes, slots)
+
+
+def schedule(post):
+    """Ставит нарезку миниатюр и вариантов картинки в пул после коммита.
+
+    При ``THUMBNAIL_WORKERS = 0`` миниатюры режутся сразу. Очередь
+    ограничена ``THUMBNAIL_QUEUE_SIZE``: пропущенное при переполнении
+    дорежет команда ``warm_thumbnails``.
+    """
+    name = post.image.name
+    if not settings.THUMBNAIL_WORKERS:
+        process(post.pk, name)
+        return
+    scopes = caching.post_scopes(post.author_id, post.group_id)
+    transaction.on_commit(partial(_submit, post.pk, name, scopes))
@@ -0,0 +1,201 @@
+from functools import partial
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import AuthorCounters, Follow, Post, TimelineEntry
+from .utils import CursorPaginator, MergedCursorPaginator
+
+BATCH_SIZE = 1000
+# Последние посты автора в ленту каждой подписки из ``condition``.
+# Коррелированный подзапрос с LIMIT идёт по индексу (author, -pub_date, -id)
+FILL_SQL = '''
+    INSERT OR IGNORE INTO {entries} (user_id, post_id, author_id, pub_date)
+    SELECT follow.user_id, post.id, post.author_id, post.pub_date
+    FROM {follows} AS follow
+    JOIN {posts} AS post ON post.id IN (
+        SELECT latest.id FROM {posts} AS latest
+        WHERE latest.author_id = follow.author_id
+        ORDER BY latest.pub_date DESC, latest.id DESC
+        LIMIT %s
+    )
+    WHERE {condition}
+'''
+
+
+def _entry(user_id, post):
+    return TimelineEntry(
+        user_id=user_id,
+        post_id=post.pk,
+        author_id=post.author_id,
+        pub_date=post.pub_date,
+    )
+
+
+def is_celebrity(author_id):
+    """Слишком много подписчиков: посты автора читаются при показе ленты."""
+    return AuthorCounters.objects.filter(
+        user_id=author_id,
+        follower_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def celebrities_followed_by(user_id):
+    return list(AuthorCounters.objects.filter(
+        user__following__user_id=user_id,
+        follower_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True))
+
+
+def fan_out(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (_entry(user_id, post) for user_id in followers.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).only(
+        'pk', 'author_id', 'pub_date'
+    )[:settings.TIMELINE_BACKFILL_SIZE]
+    TimelineEntry.objects.bulk_create(
+        [_entry(user_id, post) for post in posts],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+
+
+def _fill_sql(condition):
+    quote = connection.ops.quote_name
+    return FILL_SQL.format(
+        entries=quote(TimelineEntry._meta.db_table),
+        follows=quote(Follow._meta.db_table),
+        posts=quote(Post._meta.db_table),
+        condition=condition,
+    )
+
+
+def refill(author_id):
+    """Кладёт последние посты автора в ленты всех его подписчиков.
+
+    Нужна, когда автор перестаёт быть знаменитостью: его посты больше
+    не дочитываются при показе ленты, а опубликованные за это время
+    в ленты не копировались.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_fill_sql('follow.author_id = %s'),
+                       [settings.TIMELINE_BACKFILL_SIZE, author_id])
+
+
+def unfollowed(user_id, author_id):
+    """Отписка: лента читателя и, если автор стал обычным, чужие ленты."""
+    trim(user_id, author_id)
+    # Счётчик уже уменьшен в этой же транзакции, а запись в SQLite
+    # сериализована: ровно одна отписка видит переход через порог
+    if AuthorCounters.objects.filter(
+            user_id=author_id,
+            follower_count=settings.TIMELINE_FANOUT_LIMIT - 1).exists():
+        refill(author_id)
+
+
+def follow_batches(batch_size=BATCH_SIZE):
+    """Подписки порциями по ключу, а не одним курсором.
+
+    Открытый курсор держит снимок базы, пока идут записи: в WAL это
+    запрещает контрольную точку, и журнал растёт до конца пересборки.
+    """
+    follows = Follow.objects.order_by('pk').values_list(
+        'pk', 'user_id', 'author_id')
+    last = 0
+    while True:
+        batch = list(follows.filter(pk__gt=last)[:batch_size])
+        if not batch:
+            return
+        last = batch[-1][0]
+        yield batch
+
+
+def celebrities():
+    """Id авторов, чьи посты не копируются в ленты."""
+    return list(
+        Follow.objects.values('author_id')
+        .annotate(total=Count('pk'))
+        .filter(total__gte=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list('author_id', flat=True)
+    )
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Пересобирает все ленты по текущим подпискам.
+
+    Каждая порция подписок заполняется одним ``INSERT ... SELECT`` в
+    своей транзакции — то же, что ``backfill`` для каждой подписки, но
+    без запросов на строку.
+    """
+    TimelineEntry.objects.all().delete()
+    sql = _fill_sql('follow.id > %s AND follow.id <= %s')
+    excluded = celebrities()
+    if excluded:
+        sql += ' AND follow.author_id NOT IN ({})'.format(
+            ', '.join(['%s'] * len(excluded)))
+    last = 0
+    for batch in follow_batches(batch_size):
+        params = [settings.TIMELINE_BACKFILL_SIZE, last, batch[-1][0]]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, params + excluded)
+        last = batch[-1][0]
+
+
+def _pick(names, prefix, row):
+    return {name: row[f'{prefix}{name}'] for name in names}
+
+
+def feed_paginator(user, per_page, values=None):
+    """Лента подписок: материализованные записи плюс посты знаменитостей.
+
+    Посты авторов, у которых не меньше ``TIMELINE_FANOUT_LIMIT``
+    подписчиков, не копируются в ленты, а дочитываются одним
+    ограниченным запросом по всем таким авторам и сливаются с лентой.
+    Если задан ``values`` — имена полей поста для ``.values()``, — на
+    странице вместо постов словари с этими полями.
+    """
+    entries = user.timeline.select_related('post__author', 'post__group')
+    entry_item = attrgetter('post')
+    posts = Post.objects.select_related('author', 'group')
+    post_item = None
+    if values is not None:
+        entries = user.timeline.values(
+            'pub_date', 'post_id', *(f'post__{name}' for name in values))
+        entry_item = partial(_pick, values, 'post__')
+        posts = Post.objects.values(
+            *dict.fromkeys(('pk', 'pub_date', *values)))
+        post_item = partial(_pick, values, '')
+    sources = [CursorPaginator(
+        entries,
+        per_page,
+        ordering=('-pub_date', '-post_id'),
+        item=entry_item,
+    )]
+    celebrities = celebrities_followed_by(user.pk)
+    if celebrities:
+        sources.append(CursorPaginator(
+            posts.filter(author_id__in=celebrities), per_page,
+            item=post_item))
+    return MergedCursorPaginator(sources, per_page)
@@ -3,22 +3,37 @@ from django.urls import path
 from posts.views import (group_posts, index, post_create,
                          post_edit, post_view, profile,
                          follow_index, profile_follow, profile_unfollow,
-                         add_comment)
+                         add_comment, post_search, index_feed, group_feed,
+                         profile_feed, data_export, post_comments,
+                         comment_thread)
 from core.views import page_not_found
 
 app_name = 'posts'
 urlpatterns = [
     path('group/<slug:slug>/', group_posts, name='group_list'),
+    path('group/<slug:slug>/feed/<str:feed_format>/', group_feed,
+         name='group_feed'),
     path('profile/<str:username>/', profile, name='profile'),
+    path('profile/<str:username>/feed/<str:feed_format>/', profile_feed,
+         name='profile_feed'),
     path('posts/<int:post_id>/', post_view, name='post_detail'),
     path('create/', post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', post_edit, name='post_edit'),
     path('posts/<int:post_id>/edit/', post_edit, name='edit'),
     path('follow/', follow_index, name='follow_index'),
+    path('search/', post_search, name='search'),
+    path('feed/<str:feed_format>/', index_feed, name='index_feed'),
+    path('export/<str:name>/', data_export, name='export'),
     path("404/", page_not_found, name="404"),
     path('', index, name='index'),
     path(
         'posts/<int:post_id>/comment/', add_comment, name='add_comment'),
+    path(
+        'posts/<int:post_id>/comments/', post_comments,
+        name='post_comments'),
+    path(
+        'posts/<int:post_id>/comments/<int:comment_id>/', comment_thread,
+        name='comment_thread'),
     path(
         'profile/<str:username>/follow/',
         profile_follow,
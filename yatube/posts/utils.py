@@ -1,12 +1,227 @@
+import base64
+import heapq
+import json
+from itertools import islice
+from operator import itemgetter
+
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+POSTS_PER_PAGE = 10
+FEED_ORDERING = ('-pub_date', '-pk')
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def to_string(value):
+    """Значение ключа для курсора в виде, который понимает ``to_python``."""
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу сортировки без COUNT(*) и OFFSET.
+
+    Страница выбирается условием WHERE по значениям полей ``ordering``
+    последней (или первой) записи соседней страницы, поэтому время ответа
+    не зависит от глубины. Последнее поле ``ordering`` должно быть
+    уникальным, чтобы записи с одинаковой датой не терялись.
+
+    ``get_page`` возвращает обычный ``Page`` с атрибутами ``next_cursor``
+    и ``previous_cursor``; один пагинатор обслуживает один запрос.
+    Если задан ``item``, на страницу попадает ``item(row)`` вместо строки.
+    Строки могут быть и словарями из ``.values()``: тогда в них должны
+    быть ключи с именами полей ``ordering``.
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING,
+                 item=None):
+        self.ordering = ordering
+        self.item = item
+        meta = object_list.model._meta
+        self.fields = [
+            (
+                name.lstrip('-'),
+                meta.pk if name.lstrip('-') == 'pk'
+                else meta.get_field(name.lstrip('-')),
+                name.startswith('-'),
+            )
+            for name in ordering
+        ]
+        super().__init__(object_list.order_by(*ordering), per_page)
+
+    @property
+    def last_cursor(self):
+        return self.encode(PREVIOUS, None)
+
+    def encode(self, direction, obj):
+        values = None
+        if obj is not None:
+            values = [to_string(value) for value in self.key(obj)]
+        raw = json.dumps([direction, values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode(self, cursor):
+        """Разбирает токен; испорченный токен означает первую страницу."""
+        if not cursor:
+            return NEXT, None
+        try:
+            direction, values = json.loads(
+                base64.urlsafe_b64decode(cursor.encode()))
+            if direction not in (NEXT, PREVIOUS):
+                raise ValueError(direction)
+            if values is not None:
+                if len(values) != len(self.fields):
+                    raise ValueError(values)
+                values = [field.to_python(value)
+                          for (_, field, _), value
+                          in zip(self.fields, values)]
+        except (ValueError, TypeError, ValidationError):
+            return NEXT, None
+        return direction, values
+
+    def keyset_filter(self, values, backwards=False):
+        """Условие «строго после ключа» в порядке чтения.
+
+        Ведущая граница по первому полю дублирует дизъюнкцию: без неё
+        SQLite не видит в OR диапазона и просматривает индекс от начала.
+        """
+        condition = Q()
+        equal = {}
+        for (name, _, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        name, _, descending = self.fields[0]
+        lookup = 'lte' if descending != backwards else 'gte'
+        return Q(**{f'{name}__{lookup}': values[0]}) & condition
+
+    def key(self, row):
+        if isinstance(row, dict):
+            return tuple(row[name] for name, _, _ in self.fields)
+        return tuple(field.value_from_object(row)
+                     for _, field, _ in self.fields)
+
+    def convert(self, row):
+        return self.item(row) if self.item else row
+
+    def fetch(self, values, backwards=False):
+        """Читает до per_page + 1 строк за курсором в порядке запроса."""
+        queryset = self.object_list
+        if backwards:
+            queryset = queryset.reverse()
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(values, backwards))
+        return list(queryset[:self.per_page + 1])
+
+    def get_page(self, cursor):
+        direction, values = self.decode(cursor)
+        backwards = direction == PREVIOUS
+        rows = self.fetch(values, backwards)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = values is not None, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        # Номер страницы относительный: пагинатор знает только соседей,
+        # но так Page.has_next() и has_previous() работают без COUNT(*).
+        number = 2 if has_previous and rows else 1
+        self.num_pages = number + 1 if has_next and rows else number
+        page = self._get_page([self.convert(row) for row in rows],
+                              number, self)
+        page.next_cursor = page.previous_cursor = None
+        if page.has_next():
+            page.next_cursor = self.encode(NEXT, rows[-1])
+        if page.has_previous():
+            page.previous_cursor = self.encode(PREVIOUS, rows[0])
+        return page
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Keyset-страница, собранная из нескольких источников.
+
+    Каждый источник — ``CursorPaginator`` с совместимым ключом сортировки
+    (например, ``(pub_date, post_id)`` ленты и ``(pub_date, pk)`` постов).
+    Источник читается своим запросом не более чем на per_page + 1 строк,
+    строки объединяются k-way слиянием через кучу, дубли ключа
+    отбрасываются. Курсоры совместимы с курсорами первого источника.
+    """
+
+    def __init__(self, sources, per_page):
+        self.sources = sources
+        first = sources[0]
+        super().__init__(first.object_list, per_page, first.ordering)
+
+    def key(self, row):
+        index, row = row
+        return self.sources[index].key(row)
+
+    def convert(self, row):
+        index, row = row
+        return self.sources[index].convert(row)
+
+    def encode(self, direction, row):
+        if row is None:
+            return super().encode(direction, None)
+        index, row = row
+        return self.sources[index].encode(direction, row)
+
+    def fetch(self, values, backwards=False):
+        streams = [
+            [(source.key(row), index, row)
+             for row in source.fetch(values, backwards)]
+            for index, source in enumerate(self.sources)
+        ]
+        descending = self.fields[0][2]
+        merged = heapq.merge(
+            *streams, key=itemgetter(0), reverse=descending != backwards)
+        rows = []
+        previous_key = None
+        for key, index, row in merged:
+            if key == previous_key:
+                continue
+            previous_key = key
+            rows.append((index, row))
+            if len(rows) > self.per_page:
+                break
+        return rows
+
+
+class RawSubquery(RawSQL):
+    """Сырой подзапрос для ``pk__in``.
+
+    Django 2.2 сам оборачивает правую часть ``__in`` в скобки, а
+    ``IN ((SELECT ...))`` SQLite читает как скалярный подзапрос
+    и берёт из него только первую строку.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_page_context(queryset, request, ordering=FEED_ORDERING):
+    paginator = CursorPaginator(queryset, POSTS_PER_PAGE, ordering)
+    return get_paginator_context(paginator, request)
 
 
-def get_page_context(queryset, request):
-    paginator = Paginator(queryset, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def get_paginator_context(paginator, request):
+    cursor = request.GET.get('cursor')
+    page_obj = paginator.get_page(cursor)
     return {
         'paginator': paginator,
-        'page_number': page_number,
+        'cursor': cursor,
         'page_obj': page_obj,
     }
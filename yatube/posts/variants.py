@@ -0,0 +1,140 @@
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .models import ImageVariant, Post
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+# Параметры сохранения: прогрессивный JPEG грузится слоями, а EXIF
+# не передаётся ни в один формат и в файлы не попадает.
+SAVE_OPTIONS = {
+    'WEBP': {'quality': 80, 'method': 4},
+    'JPEG': {'quality': 82, 'progressive': True, 'optimize': True},
+}
+# Самый совместимый формат идёт в src и srcset тега <img>
+FALLBACK_FORMAT = 'JPEG'
+
+
+def variant_dir(source):
+    """Каталог вариантов зависит только от исходного файла.
+
+    Посты с одной и той же картинкой используют одни варианты.
+    """
+    digest = hashlib.sha1(source.encode()).hexdigest()
+    return f'variants/{digest[:2]}/{digest}'
+
+
+def widths_for(image_width):
+    """Ширины из настроек, не больше исходной; самая узкая — всегда."""
+    widths = sorted(settings.POST_IMAGE_WIDTHS)
+    return [width for width in widths
+            if width <= image_width or width == widths[0]]
+
+
+def image_storage():
+    """Хранилище исходных картинок постов."""
+    return Post._meta.get_field('image').storage
+
+
+def open_image(source):
+    with image_storage().open(source) as file:
+        image = Image.open(file)
+        # Поворот из EXIF применяется к пикселям до того, как EXIF уйдёт
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def variant_height(width):
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    return round(width * ratio_height / ratio_width)
+
+
+def render(image, width, image_format):
+    resized = ImageOps.fit(
+        image, (width, variant_height(width)), Image.LANCZOS)
+    buffer = BytesIO()
+    resized.save(buffer, image_format, **SAVE_OPTIONS[image_format])
+    return ContentFile(buffer.getvalue())
+
+
+def generate(post_id, source):
+    """Режет варианты картинки ``source`` и записывает их для поста.
+
+    Готовые варианты этой картинки у поста не пересоздаются, уже
+    существующие файлы (та же картинка у другого поста) повторно
+    не кодируются. Если за время нарезки картинку поста сменили,
+    результат отбрасывается: новую картинку нарежет её собственная задача.
+    """
+    if ImageVariant.objects.filter(post_id=post_id, source=source).exists():
+        return
+    directory = variant_dir(source)
+    image = open_image(source)
+    variants = []
+    for width in widths_for(image.width):
+        for image_format in settings.POST_IMAGE_FORMATS:
+            name = f'{directory}/{width}.{EXTENSIONS[image_format]}'
+            if not default_storage.exists(name):
+                default_storage.save(name, render(image, width, image_format))
+            variants.append(ImageVariant(
+                post_id=post_id, source=source, format=image_format,
+                width=width, height=variant_height(width), name=name))
+    with transaction.atomic():
+        if not Post.objects.filter(pk=post_id, image=source).exists():
+            return
+        ImageVariant.objects.filter(post_id=post_id).delete()
+        ImageVariant.objects.bulk_create(variants)
+
+
+def srcset(variants):
+    return ', '.join(f'{default_storage.url(variant.name)} {variant.width}w'
+                     for variant in variants)
+
+
+def picture(variants):
+    """Данные для <picture>: по одному srcset на формат и src для <img>."""
+    by_format = {}
+    for variant in sorted(variants, key=lambda variant: variant.width):
+        by_format.setdefault(variant.format, []).append(variant)
+    fallback = by_format.pop(FALLBACK_FORMAT, None)
+    if not fallback:
+        return None
+    largest = fallback[-1]
+    return {
+        'sources': [
+            {'type': MIME_TYPES[image_format], 'srcset': srcset(items)}
+            for image_format, items in by_format.items()
+        ],
+        'src': default_storage.url(largest.name),
+        'srcset': srcset(fallback),
+        'sizes': settings.POST_IMAGE_SIZES,
+        'width': largest.width,
+        'height': largest.height,
+    }
+
+
+def prefetch(posts):
+    """Варианты картинок всех постов страницы одним запросом.
+
+    Результат ``picture()`` кладётся в ``post.prefetched_picture``;
+    пока варианты не готовы, там None.
+    """
+    posts = [post for post in posts if post.image]
+    if not posts:
+        return
+    found = {}
+    for variant in ImageVariant.objects.filter(
+            post__in=[post.pk for post in posts]):
+        found.setdefault((variant.post_id, variant.source), []).append(
+            variant)
+    for post in posts:
+        post.prefetched_picture = picture(
+            found.get((post.pk, post.image.name), []))
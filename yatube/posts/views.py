@@ -1,56 +1,158 @@
 from django.contrib.auth import get_user_model
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 
 from posts.forms import PostForm, CommentForm
 
-from .models import Group, Post, Follow
-from .utils import get_page_context
+from . import (caching, export, graph, search, suggestions, threads,
+               timeline)
+from .feeds import feed_response
+from .conditional import (conditional_page, group_state, index_state,
+                          page_object, post_state, profile_state)
+from .models import Comment, Group, Post, Follow
+from .utils import POSTS_PER_PAGE, get_page_context, get_paginator_context
 
 User = get_user_model()
 
 
+def post_comment(post, comment_id):
+    """Видимый комментарий поста по id из запроса или None."""
+    if not comment_id or not comment_id.isdigit():
+        return None
+    return post.comments.filter(
+        pk=comment_id, active=True).select_related('author').first()
+
+
+@conditional_page(index_state)
 def index(request):
-    context = get_page_context(Post.objects.all(), request)
+    posts = Post.objects.select_related('author', 'group')
+    context = get_page_context(posts, request)
+    context.update(caching.fragment_context(caching.GLOBAL))
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(group_state)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = page_object(request) or get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
     context = {
         'group': group,
         'posts': posts,
     }
-    context.update(get_page_context(group.posts.all(), request))
+    context.update(get_page_context(posts, request))
+    context.update(caching.fragment_context(caching.group_scope(group.pk)))
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(profile_state)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = page_object(request) or get_object_or_404(
+        User.objects.select_related('counters'), username=username)
     context = {
         'author': author,
+        'following': (request.user.is_authenticated
+                      and request.user != author
+                      and graph.follows(request.user.pk, author.pk)),
     }
-    context.update(get_page_context(author.posts.all(), request))
+    posts = author.posts.select_related('group')
+    context.update(get_page_context(posts, request))
+    context.update(caching.fragment_context(caching.author_scope(author.pk)))
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page(post_state)
 def post_view(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'), pk=post_id)
     form = CommentForm()
     template = 'posts/post_detail.html'
     context = {
         'post': post,
+        'post_id': post.pk,
         'requser': request.user,
-        'comments': comments,
+        'comments': threads.thread_page(post.pk),
         'form': form,
+        'reply_to': post_comment(post, request.GET.get('reply_to')),
     }
     return render(request, template, context)
 
 
+@conditional_page(post_state)
+def post_comments(request, post_id):
+    """Следующая страница веток — фрагмент для post_detail."""
+    context = {
+        'post_id': post_id,
+        'comments': threads.thread_page(post_id, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@conditional_page(post_state)
+def comment_thread(request, post_id, comment_id):
+    """Ветка целиком — фрагмент вместо обрезанной на странице поста."""
+    root = get_object_or_404(
+        Comment, pk=comment_id, post_id=post_id, depth=0, active=True)
+    context = {
+        'post_id': post_id,
+        'comments': threads.whole_thread(root),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@conditional_page(index_state)
+def index_feed(request, feed_format):
+    return feed_response(
+        request, feed_format, caching.GLOBAL, Post.objects.all(),
+        'Yatube: последние записи', reverse('posts:index'))
+
+
+@conditional_page(group_state)
+def group_feed(request, slug, feed_format):
+    group = page_object(request) or get_object_or_404(Group, slug=slug)
+    return feed_response(
+        request, feed_format, caching.group_scope(group.pk), group.posts,
+        f'Yatube: {group.title}', reverse('posts:group_list', args=[slug]),
+        group.description)
+
+
+@conditional_page(profile_state)
+def profile_feed(request, username, feed_format):
+    author = page_object(request) or get_object_or_404(
+        User, username=username)
+    return feed_response(
+        request, feed_format, caching.author_scope(author.pk), author.posts,
+        f'Yatube: записи {author.username}',
+        reverse('posts:profile', args=[username]))
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    context = {'query': query}
+    context.update(search.search_page(
+        query, request.GET.get('cursor'), POSTS_PER_PAGE))
+    return render(request, 'posts/search.html', context)
+
+
+@staff_member_required
+def data_export(request, name):
+    output_format = request.GET.get('format', 'ndjson')
+    if name not in export.MODELS or output_format not in export.FORMATS:
+        raise Http404
+    compress = 'gzip' in request.GET
+    response = StreamingHttpResponse(
+        export.export(name, output_format, compress),
+        content_type=('application/gzip' if compress
+                      else export.FORMATS[output_format]))
+    filename = export.filename(name, output_format, compress)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -59,13 +161,16 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        parent = post_comment(post, request.POST.get('parent'))
+        if parent is not None:
+            comment.parent_id = threads.reply_parent(parent)
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
     post = form.save(commit=False)
@@ -97,12 +202,9 @@ def post_edit(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    context = {'page_obj': page_obj}
+    paginator = timeline.feed_paginator(request.user, POSTS_PER_PAGE)
+    context = get_paginator_context(paginator, request)
+    context['suggestions'] = suggestions.for_user(request.user)
     return render(request, 'posts/follow.html', context)
 
 
@@ -110,16 +212,17 @@ def follow_index(request):
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        # Один INSERT; повторный клик упирается в unique_follow
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            pass
     return redirect('posts:profile', author)
 
 
 @login_required
 def profile_unfollow(request, username):
-    user_follower = get_object_or_404(
-        Follow,
-        user=request.user,
-        author__username=username
-    )
-    user_follower.delete()
+    author = get_object_or_404(User, username=username)
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username)
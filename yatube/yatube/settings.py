@@ -42,9 +42,9 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
-    'django.contrib.staticfiles',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -96,12 +97,52 @@ APPEND_SLASH = True
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 с WAL и прагмами для конкурентной работы, см. core/db
+        'ENGINE': 'core.db',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение потока переживает запрос и закрывается через минуту
+        'CONN_MAX_AGE': 60,
     }
 }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+# Время жизни закешированных списков постов; устаревшие поколения
+# вытесняются по TTL и при переполнении кеша
+FEED_CACHE_TIMEOUT = 60 * 15
+# Сколько последних постов отдают ленты Atom и RSS
+FEED_SIZE = 50
+# Комментариев на странице поста и в каждой догружаемой порции
+COMMENTS_PER_PAGE = 20
+# Ответов, показываемых под каждой веткой; остальные — по ссылке
+COMMENT_REPLIES = 3
+# Глубже ответы встают рядом с родителем, а не под ним
+COMMENT_MAX_DEPTH = 5
+
+
+# Сколько SQL-запросов разрешено view за один HTTP-запрос
+QUERY_BUDGETS = {
+    'posts:index': 5,
+    'posts:group_list': 5,
+    'posts:profile': 5,
+    'posts:post_detail': 6,
+    'posts:follow_index': 6,
+    'posts:search': 6,
+}
+# Повтор одной формы запроса больше этого числа раз считается N+1
+QUERY_REPEAT_LIMIT = 3
+# Превышение бюджета: True — исключение, False — запись в лог
+QUERY_BUDGET_RAISE = False
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -152,4 +193,45 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Сколько последних постов автора попадает в ленту при подписке на него
+TIMELINE_BACKFILL_SIZE = 500
+# Посты авторов с таким числом подписчиков не копируются в ленты,
+# а дочитываются при показе ленты подписок
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько подписок и отписок граф подписок держит поверх своей основы,
+# прежде чем пересобрать её в памяти
+FOLLOW_GRAPH_COMPACT_SIZE = 1000
+# Журнал правок подписок (posts.graph): по нему процессы догоняют свой
+# граф без запросов к базе. Файл общий для воркеров, как и файл SQLite;
+# выросший больше FOLLOW_GRAPH_LOG_SIZE байт начинается заново, и все
+# перечитывают граф. Правку, которой нет в журнале дольше
+# FOLLOW_GRAPH_LOG_WAIT секунд, процесс ищет, перечитав граф из базы
+FOLLOW_GRAPH_LOG = os.path.join(BASE_DIR, 'follows.log')
+FOLLOW_GRAPH_LOG_SIZE = 16 * 1024 * 1024
+FOLLOW_GRAPH_LOG_WAIT = 5
+# Сколько самых активных пользователей и авторов показывать в фильтрах
+# списка подписок в админке
+FOLLOW_ADMIN_FILTER_SIZE = 50
+# Сколько рекомендаций авторов хранить на пользователя и сколько из них
+# показывать на странице подписок
+SUGGESTIONS_SIZE = 20
+SUGGESTIONS_SHOWN = 5
+
+# Миниатюры картинок постов: имя -> (геометрия, опции sorl-thumbnail).
+# Нарезаются при загрузке картинки, шаблоны только берут готовый URL.
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Потоков фоновой нарезки миниатюр; 0 — резать сразу при сохранении
+THUMBNAIL_WORKERS = 2
+# Сколько нарезок может ждать потоков; лишние дорежет warm_thumbnails
+THUMBNAIL_QUEUE_SIZE = 100
+
+# Адаптивные варианты картинок постов для srcset: ширины в px, форматы
+# и пропорции кадра; режутся в том же пуле, что и миниатюры
+POST_IMAGE_WIDTHS = (320, 640, 960, 1280)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_SIZES = '(max-width: 1000px) 100vw, 960px'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'